@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#   "PyYAML",
+#   "Markdown",
+#   "Jinja2",
+#   "Pillow",
+# ]
+# ///
+"""
+dsssg benchmark — builds seeded synthetic sites of several sizes and reports
+time and peak memory per build phase for cold, warm and one-file-changed builds.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import struct
+import random
+import argparse
+import subprocess
+from datetime import date, timedelta
+
+DSSSG_DIR = os.path.dirname(os.path.abspath(__file__))
+BUILD_SCRIPT = os.path.join(DSSSG_DIR, 'build.py')
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog static site generator markdown template "
+    "build cache render page post tag archive feed sitemap image style script music "
+    "jazz linux python radio film review tutorial server deploy write read simple fast"
+).split()
+
+CODE_SNIPPETS = [
+    ('python', 'def greet(name):\n    return f"Hello, {name}!"\n\nprint(greet("world"))'),
+    ('sh', 'for f in *.md; do\n    wc -w "$f"\ndone'),
+    ('js', 'const squares = [1, 2, 3].map((n) => n * n);\nconsole.log(squares);'),
+]
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark dsssg builds on synthetic corpora")
+    parser.add_argument('--sizes', default='100,5000,50000',
+                        help="comma-separated post counts to benchmark (default: 100,5000,50000)")
+    parser.add_argument('--tags', type=int, default=50, help="distinct tags in the corpus (default: 50)")
+    parser.add_argument('--nav', type=int, default=5, help="nav pages (default: 5)")
+    parser.add_argument('--code-blocks', type=int, default=2, help="fenced code blocks per post (default: 2)")
+    parser.add_argument('--images', type=int, default=10,
+                        help="images in images_dir, referenced from posts (default: 10)")
+    parser.add_argument('--optimize-images', action='store_true', help="enable image_optimize in the corpus config")
+    parser.add_argument('--seed', type=int, default=1, help="corpus random seed (default: 1)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="passed to build.py --jobs")
+    parser.add_argument('--workdir', default='.bench', help="where corpora are generated (default: .bench)")
+    parser.add_argument('--output', default='bench-results.json', help="JSON results file (default: bench-results.json)")
+    return parser.parse_args(argv)
+
+def words(rng, count):
+    """A run of count random words"""
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+def write_png(path, width, height, seed):
+    """Write an RGB gradient PNG without needing Pillow"""
+    red = bytes((x * 255 // width + seed * 40) % 256 for x in range(width))
+    blue = bytes([(seed * 70) % 256]) * width
+    rows = []
+    for y in range(height):
+        row = bytearray(width * 3)
+        row[0::3], row[1::3], row[2::3] = red, bytes([y * 255 // height]) * width, blue
+        rows.append(b'\x00' + bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(b''.join(rows), 6)))
+        f.write(chunk(b'IEND', b''))
+
+def generate_corpus(root, posts, tags, nav, code_blocks, images, seed, optimize_images=False):
+    """
+    Generate a site under root: posts with Zipf-distributed tags, nav pages, images,
+    a matching tags.yaml and a config.yaml that uses this checkout's templates and static files.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    for directory in ('content/posts', 'content/nav', 'images'):
+        os.makedirs(os.path.join(root, directory))
+
+    tag_names = [f"{rng.choice(WORDS)}-{i}" for i in range(tags)]
+    tag_weights = [1 / (i + 1) for i in range(tags)]
+    with open(os.path.join(root, 'tags.yaml'), 'w', encoding='utf-8') as f:
+        for i, tag in enumerate(tag_names):
+            f.write(f'{tag}:\n  description: "{words(rng, 8)}"\n  display_name: "{tag.title()}"\n')
+            if i % 3 == 0:
+                f.write(f'  color: "#{rng.randrange(0x1000000):06x}"\n')
+
+    for i in range(images):
+        write_png(os.path.join(root, 'images', f"img-{i:04d}.png"), 1600, 1000, i)
+
+    start = date(2000, 1, 1)
+    for i in range(posts):
+        post_tags = sorted(set(rng.choices(tag_names, tag_weights, k=rng.randint(1, 4))))
+        body = [f"{words(rng, 40)}.", f"## {words(rng, 4).title()}", f"{words(rng, 60)}.",
+                f"- {words(rng, 5)}\n- {words(rng, 5)}\n- {words(rng, 5)}"]
+        for _ in range(code_blocks):
+            language, code = rng.choice(CODE_SNIPPETS)
+            body.append(f"```{language}\n{code}\n```")
+        if images and i % 4 == 0:
+            body.insert(1, f"![{words(rng, 3)}](/images/img-{rng.randrange(images):04d}.png)")
+        body.append(f"{words(rng, 50)}.")
+        post_date = start + timedelta(days=i * 9000 // posts)
+        with open(os.path.join(root, 'content/posts', f"post-{i:06d}.md"), 'w', encoding='utf-8') as f:
+            f.write(f'---\ntitle: "{words(rng, 5).title()}"\ndate: {post_date.isoformat()}\n'
+                    f'tags: [{", ".join(post_tags)}]\n---\n\n' + '\n\n'.join(body) + '\n')
+
+    for i in range(nav):
+        with open(os.path.join(root, 'content/nav', f"page-{i}.md"), 'w', encoding='utf-8') as f:
+            f.write(f'---\ntitle: "{words(rng, 2).title()}"\nnav_order: {i}\n---\n\n{words(rng, 120)}.\n')
+
+    with open(os.path.join(root, 'config.yaml'), 'w', encoding='utf-8') as f:
+        f.write(f'site_title: "Benchmark"\n'
+                f'site_url: "https://example.com"\n'
+                f'template_dir: "{os.path.join(DSSSG_DIR, "templates")}"\n'
+                f'static_dir: "{os.path.join(DSSSG_DIR, "static")}"\n'
+                f'images_dir: "images"\n'
+                f'image_optimize: {str(optimize_images).lower()}\n')
+
+def run_build(root, jobs):
+    """
+    Build the corpus in a fresh process with --profile and return its report, plus the
+    build's own peak memory (including the worker processes it waited for) where wait4 exists
+    """
+    report_path = os.path.join(root, 'profile.json')
+    command = [sys.executable, BUILD_SCRIPT, 'config.yaml', '--profile', report_path]
+    if jobs is not None:
+        command += ['--jobs', str(jobs)]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=root, stdout=subprocess.DEVNULL)
+    peak_rss_mb = None
+    if hasattr(os, 'wait4'):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        peak_rss_mb = round(usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+    else:
+        process.wait()
+    wall = time.perf_counter() - start
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    with open(report_path, encoding='utf-8') as f:
+        report = json.load(f)
+    report['wall_seconds'] = wall
+    report['peak_rss_mb'] = peak_rss_mb
+    return report
+
+def main():
+    args = parse_args()
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        root = os.path.abspath(os.path.join(args.workdir, f"posts-{size}"))
+        start = time.perf_counter()
+        generate_corpus(root, size, args.tags, args.nav, args.code_blocks, args.images, args.seed, args.optimize_images)
+        print(f"Generated {size} posts in {time.perf_counter() - start:.1f}s")
+
+        for scenario in ('cold', 'warm', 'one-file-changed'):
+            if scenario == 'cold':
+                for directory in ('site', '.dsssg-cache'):
+                    shutil.rmtree(os.path.join(root, directory), ignore_errors=True)
+            elif scenario == 'one-file-changed':
+                with open(os.path.join(root, 'content/posts', f"post-{size // 2:06d}.md"), 'a', encoding='utf-8') as f:
+                    f.write('\nAn edited paragraph.\n')
+            report = run_build(root, args.jobs)
+            results.append({'posts': size, 'scenario': scenario, **report})
+
+            peak = f"{report['peak_rss_mb']:>9.1f} MiB peak" if report['peak_rss_mb'] is not None else ''
+            print(f"  {scenario:<18}{report['wall_seconds']:>9.2f}s wall{peak}")
+            for phase in report['phases']:
+                rss = f"{phase['peak_rss_mb']:>9.1f} MiB" if phase['peak_rss_mb'] is not None else ''
+                print(f"    {phase['phase']:<20}{phase['seconds']:>9.3f}s{rss}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
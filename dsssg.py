@@ -0,0 +1,2612 @@
+"""
+dsssg — Dead Simple Static Site Generator
+
+Processes Markdown content with YAML front matter into a static site.
+Supports tags, nav pages, root pages, image optimization, and Jinja2 templates.
+
+The build engine. Builder(config) builds one site; build.py is its command line.
+"""
+
+import os
+import sys
+import re
+import yaml
+import pickle
+import sqlite3
+import shutil
+import hashlib
+import html
+import json
+import heapq
+import operator
+import math
+import time
+import tempfile
+import threading
+import queue
+import uuid
+import weakref
+import importlib.util
+import itertools
+import contextlib
+import contextvars
+import filecmp
+import fnmatch
+import gzip
+import markdown
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, meta, nodes
+from jinja2.ext import Extension
+
+DSSSG_VERSION = '1.1.0'
+CACHE_VERSION = 3
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables']
+
+# Excerpt lengths used by the bundled templates, precomputed for every post at ingest
+EXCERPT_LENGTHS = (700, 160)
+
+DEFAULT_CONFIG = {
+    'content_dir': 'content/posts',
+    'nav_dir': 'content/nav',
+    'static_dir': 'static',
+    'output_dir': 'site',
+    'template_dir': 'templates',
+    'tag_template': 'tag.html',
+    'post_template': 'post.html',
+    'index_template': 'index.html',
+    'tags_template': 'tags.html',
+    'archive_template': 'archive.html',
+    'sitemap_max_urls': 50000,
+    'rss_max_items': None,
+    'rss_full_content': True,
+    'tag_feeds': False,
+    'site_title': 'My Website',
+    'site_description': 'A tagged website built with dsssg',
+    'site_url': 'https://example.com',
+    'author': None,
+    'date_format': '%Y-%m-%d',
+    'tags_file': 'tags.yaml',
+    'images_dir': 'images',
+    'files_dir': None,
+    'root_dir': 'root',
+    'meta_delimiter': '',
+    'footer_left': None,
+    'footer_right': None,
+    'additional_scripts': None,
+    'image_optimize': False,
+    'image_max_width': 1200,
+    'image_quality': 85,
+    'image_widths': None,
+    'image_formats': None,
+    'image_sizes': '(max-width: 800px) 100vw, 800px',
+    'cache_dir': '.dsssg-cache',
+    'build_jobs': 1,
+    'related_posts_count': 3,
+    'related_posts_weighting': 'shared',
+    'posts_per_page': None,
+    'archives': False,
+    'low_memory': False,
+    'markdown_backend': 'markdown',
+    'write_threads': 4,
+    'fingerprint_assets': False,
+    'asset_hardlinks': False,
+    'precompress': False,
+    'minify': False,
+    'search': False,
+    'search_prefix_length': 2,
+}
+
+# Config keys naming files or directories, resolved against a Builder's root.
+# images_dir is left as written: it is also the images' path under output_dir.
+PATH_KEYS = ('content_dir', 'nav_dir', 'root_dir', 'static_dir', 'template_dir', 'output_dir',
+             'tags_file', 'files_dir', 'cache_dir')
+
+def load_config(config_path='config.yaml'):
+    """Load a site config file, merged over defaults. A missing file means all defaults."""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config.update(yaml.safe_load(f) or {})
+    return config
+
+def extract_front_matter(content):
+    """Extract YAML front matter from markdown content"""
+    front_matter_match = re.match(r'^---\s*\n(.*?)\n---\s*\n', content, re.DOTALL)
+    if front_matter_match:
+        front_matter_text = front_matter_match.group(1)
+        content_without_front_matter = content[front_matter_match.end():]
+        try:
+            front_matter = yaml.safe_load(front_matter_text)
+            return front_matter, content_without_front_matter
+        except yaml.YAMLError as e:
+            print(f"Error parsing YAML front matter: {e}")
+            return {}, content
+    return {}, content
+
+class PythonMarkdownBackend:
+    """Python-Markdown, the default markdown_backend"""
+    name = 'markdown'
+
+    def __init__(self, extensions):
+        self.converter = markdown.Markdown(extensions=list(extensions))
+
+    @staticmethod
+    def version():
+        return markdown.__version__
+
+    def convert(self, text):
+        return self.converter.reset().convert(text)
+
+class MarkdownItBackend:
+    """markdown-it-py, a faster CommonMark parser (pip install markdown-it-py)"""
+    name = 'markdown-it'
+
+    def __init__(self, extensions):
+        from markdown_it import MarkdownIt
+        self.converter = MarkdownIt('commonmark')
+        if 'tables' in extensions:
+            self.converter.enable('table')
+
+    @staticmethod
+    def version():
+        from markdown_it import __version__
+        return __version__
+
+    def convert(self, text):
+        return self.converter.render(text)
+
+# markdown_backend names. Any other backend can be named as "module:Class"; it is built
+# with the list of extensions and must provide name, version() and convert(text).
+MARKDOWN_BACKENDS = {
+    'markdown': PythonMarkdownBackend,
+    'markdown-it': MarkdownItBackend,
+}
+
+def write_pickle(path, value):
+    """Atomically pickle value to path so concurrent builds never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error writing build cache entry {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def extract_thumbnail(html_content):
+    """Return the src of the first image in the content, for use as a thumbnail"""
+    thumbnail_match = re.search(r'<img[^>]+src="([^"]+)"', html_content)
+    return thumbnail_match.group(1) if thumbnail_match else None
+
+class ContentStore:
+    """
+    Post HTML kept on disk in SQLite for low_memory builds, keyed by source hash.
+    Every process and thread opens its own connection on first use, and a pickled
+    store (e.g. sent to a render worker) carries only its path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def __reduce__(self):
+        return ContentStore, (self.path,)
+
+    @property
+    def connection(self):
+        # A forked worker inherits the parent's thread-local connection, so it is reopened by pid
+        if getattr(self.local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=60)
+            # WAL lets render workers read while ingest workers write; the store is only a cache
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS content (key TEXT PRIMARY KEY, html TEXT NOT NULL)')
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def put(self, key, html):
+        with self.connection:
+            self.connection.execute('INSERT OR IGNORE INTO content VALUES (?, ?)', (key, html))
+
+    def get(self, key):
+        row = self.connection.execute('SELECT html FROM content WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(f"{key} is missing from the content store")
+        return row[0]
+
+    def prune(self, keys):
+        """Drop the HTML of every document not in keys"""
+        stale = {row[0] for row in self.connection.execute('SELECT key FROM content')} - set(keys)
+        with self.connection:
+            self.connection.executemany('DELETE FROM content WHERE key = ?', ((key,) for key in stale))
+
+class SpilledContent:
+    """
+    A post's HTML in a low_memory build. It stays in the content store and is loaded
+    only when a template or feed prints it; the precomputed excerpts stay resident
+    so listings never load it.
+    """
+    __slots__ = ('store', 'key', 'excerpts')
+
+    def __init__(self, store, key, excerpts):
+        self.store = store
+        self.key = key
+        self.excerpts = excerpts
+
+    def __str__(self):
+        return self.store.get(self.key)
+
+    def __html__(self):
+        return str(self)
+
+class SpilledExcerpt:
+    """striptags_excerpt of SpilledContent, stripped only if it is printed rather than truncated"""
+    __slots__ = ('source',)
+
+    def __init__(self, source):
+        self.source = source
+
+    def __str__(self):
+        return html_excerpt(str(self.source))
+
+    def __html__(self):
+        return str(self)
+
+def get_post_date(front_matter):
+    """Get post date from front matter, or empty string if not set"""
+    return front_matter.get('date', "")
+
+def normalize_date(value):
+    """Turn a YYYY-MM-DD string date into a date; any other value is returned as is"""
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return value
+
+class Post:
+    """
+    A post, nav page or root page. Slotted to keep large archives compact. Fields read
+    as attributes (post.title) and, like the dicts posts used to be, as keys (post['title']).
+    sort_key is the date as YYYY-MM-DD, computed once for every sort and grouping pass.
+    """
+    __slots__ = ('title', 'hide_title', 'nav_order', 'date', 'updated', 'tags', 'content', 'slug', 'url',
+                 'thumbnail', 'excerpts', 'source_hash', 'sort_key', 'processed_tags')
+
+    def __init__(self, **fields):
+        self.processed_tags = []
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.sort_key = date_filter(self.date)
+
+    def __getitem__(self, key):
+        if key not in POST_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in POST_FIELDS else default
+
+POST_FIELDS = frozenset(Post.__slots__)
+
+def generate_tag_feed_url(slug):
+    """Generate URL for a tag's RSS feed"""
+    return f"/tags/{slug}.xml"
+
+def compute_related_posts(posts, tags_to_posts, n=3, weighting='shared'):
+    """
+    Compute up to n related posts for every post in one pass over the tag index.
+    Posts are scored by shared tag count, or with weighting='rarity' by the summed
+    rarity of shared tags. Ties go to the newer post. Returns a list aligned with posts.
+    """
+    position = {id(post): i for i, post in enumerate(posts)}
+    tag_positions = {tag: sorted({position[id(p)] for p in tag_posts})
+                     for tag, tag_posts in tags_to_posts.items()}
+    if weighting == 'rarity':
+        tag_weights = {tag: math.log(1 + len(posts) / len(positions))
+                       for tag, positions in tag_positions.items() if positions}
+    else:
+        tag_weights = dict.fromkeys(tag_positions, 1)
+
+    related = []
+    for index, post in enumerate(posts):
+        scores = defaultdict(int)
+        for tag in set(post.get('tags', [])):
+            weight = tag_weights.get(tag, 0)
+            for i in tag_positions.get(tag, ()):
+                scores[i] += weight
+        scores.pop(index, None)
+        best = heapq.nsmallest(n, ((-score, i) for i, score in scores.items()))
+        related.append([posts[i] for _, i in best])
+    return related
+
+def process_image_captions(html_content):
+    """
+    Process HTML content to add captions to images based on their alt text.
+    Converts:
+    <img src="path/to/image" alt="This is a caption">
+    To:
+    <figure>
+        <img src="path/to/image" alt="This is a caption">
+        <figcaption>This is a caption</figcaption>
+    </figure>
+    """
+    # Pattern to match img tags with alt attributes
+    img_pattern = r'<img([^>]*?)alt="([^"]*)"([^>]*?)>'
+    
+    def add_caption(match):
+        # Get the parts of the img tag
+        before_alt = match.group(1)
+        alt_text = match.group(2)
+        after_alt = match.group(3)
+        
+        # If alt text is empty, just return the original img tag
+        if not alt_text.strip():
+            return f'<img{before_alt}alt="{alt_text}"{after_alt}>'
+        
+        # Create a figure with caption
+        return f'<figure>\n  <img{before_alt}alt="{alt_text}"{after_alt}>\n  <figcaption>{alt_text}</figcaption>\n</figure>'
+    
+    # Replace img tags with figure+figcaption
+    html_with_captions = re.sub(img_pattern, add_caption, html_content)
+    
+    return html_with_captions
+
+def date_filter(date_value, format_string="%Y-%m-%d"):
+    """Format a date using strftime"""
+    if isinstance(date_value, str):
+        try:
+            date_value = datetime.strptime(date_value, "%Y-%m-%d")
+        except ValueError:
+            return date_value
+    if hasattr(date_value, 'strftime'):
+        return date_value.strftime(format_string)
+    return date_value
+
+def regex_replace(value, pattern, replacement):
+    """Replace a pattern in a string"""
+    if value is None:
+        return ''
+    return re.sub(pattern, replacement, value)
+
+VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                           'link', 'meta', 'source', 'track', 'wbr'))
+
+# Tokens seen by the excerpt engine. When stripping, figures are dropped whole;
+# otherwise script/style/iframe blocks, <head> and comments are.
+_STRIP_TOKEN_RE = re.compile(r'(<pre>.*?</pre>)|(<figure>.*?</figure>)|(<[^>]+>)|([^<]+|<)', re.DOTALL)
+
+_TRUNCATE_TOKEN_RE = re.compile(
+    r'(<pre>.*?</pre>)|(<(script|style|iframe).*?</\3>|<head>.*?</head>|<!--.*?-->)|(<[^>]+>)|([^<]+|<)', re.DOTALL)
+
+_TAG_NAME_RE = re.compile(r'<(/?)([a-zA-Z][^\s/>]*)')
+
+_KEPT_TAG_RE = re.compile(r'</?a[\s>]')
+
+def html_excerpt(html_content, length=None, strip=True):
+    """
+    Single-pass excerpt engine behind the striptags_excerpt and safe_truncate filters.
+    With strip=True, drops every tag except hyperlinks and <pre> blocks and removes
+    figures entirely. With a length, truncates to approximately that many characters
+    while keeping the HTML valid. Pre/code blocks are always included whole and count
+    as 50 chars toward the budget.
+    """
+    if html_content is None:
+        return ''
+    if strip:
+        token_re, text_group = _STRIP_TOKEN_RE, 4
+    else:
+        token_re, text_group = _TRUNCATE_TOKEN_RE, 5
+    budget = float('inf') if length is None else length
+    output = []
+    open_tags = []
+    char_count = 0
+    truncated = False
+    # Text between kept tags forms one run, split only by <pre> blocks
+    run = []
+    in_run = False
+
+    def flush_text():
+        nonlocal char_count, truncated
+        raw = ''.join(run)
+        run.clear()
+        if truncated:
+            return
+        text = html.unescape(raw) if '&' in raw else raw
+        remaining = budget - char_count
+        if remaining <= 0:
+            truncated = True
+        elif len(text) > remaining:
+            words = text[:remaining + 50].split()
+            partial = ' '.join(words[:-1]) if len(words) > 1 else text[:remaining]
+            partial = (partial or text[:remaining]) + '...'
+            output.append(html.escape(partial, quote=False) if '&' in raw else partial)
+            char_count += remaining
+            truncated = True
+        else:
+            output.append(raw)
+            char_count += len(text)
+
+    for match in token_re.finditer(html_content):
+        if truncated:
+            break
+        text = match.group(text_group)
+        if text is not None:
+            run.append(text)
+            in_run = True
+            continue
+        pre_block = match.group(1)
+        if pre_block is not None:
+            flush_text()
+            in_run = True
+            if not truncated:
+                output.append(pre_block)
+                char_count += 50
+                if char_count >= budget:
+                    truncated = True
+            continue
+        tag = match.group(text_group - 1)
+        if tag is None:
+            continue  # dropped block
+        if strip and not _KEPT_TAG_RE.match(tag):
+            continue
+        name_match = _TAG_NAME_RE.match(tag)
+        if name_match is None:
+            continue  # doctype, processing instruction
+        if in_run:
+            flush_text()
+            in_run = False
+        if truncated:
+            continue
+        name = name_match.group(2).lower()
+        if name_match.group(1):
+            if name in open_tags:
+                open_tags.remove(name)
+            output.append(f"</{name}>")
+        else:
+            if name not in VOID_ELEMENTS and not tag.endswith('/>'):
+                open_tags.append(name)
+            output.append(tag)
+    if in_run:
+        flush_text()
+
+    if length is not None:
+        output.extend(f"</{name}>" for name in reversed(open_tags))
+    return ''.join(output)
+
+class StrippedExcerpt(str):
+    """striptags_excerpt output that remembers its source HTML, so a following
+    safe_truncate can use the excerpts precomputed from that source."""
+
+def find_markdown_files(directory):
+    """Return the markdown files under directory in walk order"""
+    file_paths = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.md'):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+class OutputWriter:
+    """
+    Writes output files on background threads so rendering does not wait on the disk.
+    The queue is bounded, so rendering cannot run far ahead of the writes. close()
+    waits for pending writes and raises if any failed.
+    """
+
+    def __init__(self, write, threads, queue_size=256):
+        self.write = write
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, path, data):
+        self.queue.put((path, data))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                self.write(path, data)
+            except Exception as e:
+                self.errors.append((path, e))
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            path, error = self.errors[0]
+            raise OSError(f"Failed to write {len(self.errors)} output file(s), first {path}: {error}") from error
+
+# Bump when a minifier's output changes, so cached minified text is discarded
+MINIFY_VERSION = 2
+
+# Elements whose content is never touched by the whitespace pass
+_PROTECTED_ELEMENT_RE = re.compile(r'<(pre|code|textarea|script|style)\b[^>]*>.*?</\1\s*>', re.S | re.I)
+
+_PROTECTED_OPEN_TAG_RE = re.compile(r'<[^>]*>')
+
+_HTML_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.S)
+
+_BLOCK_TAG_RE = re.compile(
+    r'\s*(</?(?:!doctype|html|head|body|title|meta|link|div|p|ul|ol|li|dl|dt|dd|nav|header|footer|main|'
+    r'article|section|aside|h[1-6]|table|thead|tbody|tfoot|tr|td|th|figure|figcaption|picture|source|'
+    r'blockquote|hr|br|form|fieldset|select|option)\b[^>]*>)\s*', re.I)
+
+_SCRIPT_TYPE_RE = re.compile(r'\stype="([^"]*)"', re.I)
+
+_CSS_STRING_OR_COMMENT_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+
+def minify_css(source):
+    """Drop comments (except /*! notices) and the whitespace CSS syntax doesn't need, leaving strings alone"""
+    segments = []
+    for index, part in enumerate(_CSS_STRING_OR_COMMENT_RE.split(source)):
+        if index % 2 and (part[0] in '"\'' or part.startswith('/*!')):
+            segments.append((True, part))
+        elif segments and not segments[-1][0]:
+            segments[-1] = (False, segments[-1][1] + ('' if index % 2 else part))
+        else:
+            segments.append((False, '' if index % 2 else part))
+    css = []
+    for is_literal, text in segments:
+        if not is_literal:
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r'\s*([{};,>~])\s*', r'\1', text)
+            text = re.sub(r':\s+', ':', text).replace(';}', '}')
+        css.append(text)
+    return ''.join(css).strip()
+
+def minify_js(source):
+    """
+    Strip indentation and blank lines. Line breaks are kept, so automatic semicolon
+    insertion, comments, strings and regexes mean the same; scripts with template
+    literals, whose indentation can be content, are left alone.
+    """
+    if '`' in source:
+        return source
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip())
+
+def minify_protected(element, tag):
+    """Minify the content of a <script> or <style> element; <pre>, <code> and <textarea> stay as they are"""
+    if tag not in ('script', 'style'):
+        return element
+    open_tag = _PROTECTED_OPEN_TAG_RE.match(element).group(0)
+    close_start = element.rindex('</')
+    content = element[len(open_tag):close_start]
+    if tag == 'style':
+        content = minify_css(content)
+    else:
+        script_type = _SCRIPT_TYPE_RE.search(open_tag)
+        script_type = script_type.group(1).lower() if script_type else 'text/javascript'
+        if script_type == 'application/ld+json':
+            try:
+                content = json.dumps(json.loads(content), ensure_ascii=False, separators=(',', ':'))
+                # Keep the escaping of tojson, so no string can close the <script> element
+                content = content.replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026')
+            except ValueError:
+                pass
+        elif script_type in ('text/javascript', 'application/javascript', 'module'):
+            content = minify_js(content)
+    return open_tag + content + element[close_start:]
+
+def minify_html_text(text):
+    """Collapse the whitespace of markup outside protected elements"""
+    text = _HTML_COMMENT_RE.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    return _BLOCK_TAG_RE.sub(r'\1', text)
+
+def minify_html(html_content):
+    """
+    Remove comments and collapse whitespace in a rendered page. Whitespace around
+    block-level tags is dropped; elsewhere runs become one space, so inline text reads
+    the same. <pre>, <code> and <textarea> are kept byte for byte, inline CSS and JS are
+    minified, and JSON-LD is re-serialized compactly.
+    """
+    parts = []
+    position = 0
+    for match in _PROTECTED_ELEMENT_RE.finditer(html_content):
+        parts.append(minify_html_text(html_content[position:match.start()]))
+        parts.append(minify_protected(match.group(0), match.group(1).lower()))
+        position = match.end()
+    parts.append(minify_html_text(html_content[position:]))
+    return ''.join(parts).strip() + '\n'
+
+MINIFIERS = {'css': minify_css, 'js': minify_js}
+
+def same_file_stat(a, b):
+    """True if both files exist with identical size and mtime (as left by shutil.copy2)"""
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    return sa.st_size == sb.st_size and sa.st_mtime_ns == sb.st_mtime_ns
+
+IMAGE_MIME_TYPES = {'.webp': 'image/webp', '.avif': 'image/avif'}
+
+# Copied as is: re-encoding would drop GIF animation, and vector images have no pixels to resize
+COPIED_IMAGE_EXTENSIONS = ('.gif', '.svg', '.svgz')
+
+def image_files(images_dir):
+    """Return the files under images_dir in walk order"""
+    return [os.path.join(root, file) for root, _, files in os.walk(images_dir) for file in files]
+
+def srcset_attr(candidates):
+    return ', '.join(f"{url} {width}w" for url, width in candidates)
+
+_IMG_TAG_RE = re.compile(r'<img\b([^>]*?)\s*/?>')
+
+_SRC_ATTR_RE = re.compile(r'\ssrc="([^"]*)"')
+
+DSSSG_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+def copy_file(src_path, dst_path, link=False):
+    """
+    Copy (or with link, hardlink) a file over dst_path through a temporary file, so an
+    existing destination that is a hardlink to some source is replaced, never written through
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if link:
+            try:
+                os.link(src_path, tmp_path)
+            except OSError:
+                # Another filesystem, or one without hardlinks
+                shutil.copy2(src_path, tmp_path)
+        else:
+            shutil.copy2(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def tree_files(src_dir, dst_dir, skip_top_level=None):
+    """Map every file under src_dir to its destination under dst_dir as {destination: source}"""
+    mapping = {}
+    for root, dirs, files in os.walk(src_dir):
+        if skip_top_level and os.path.samefile(root, src_dir):
+            dirs[:] = [d for d in dirs if d != skip_top_level]
+        for file in files:
+            src_path = os.path.join(root, file)
+            mapping[os.path.join(dst_dir, os.path.relpath(src_path, src_dir))] = src_path
+    return mapping
+
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+
+def post_year_month(post):
+    """Return (year, month) of a post's date, or None if it has no usable date"""
+    return date_year_month(post.date)
+
+def date_year_month(date):
+    """Return (year, month) of a date or YYYY-MM-DD string, or None if it is not usable"""
+    if isinstance(date, str):
+        try:
+            date = datetime.strptime(date[:10], '%Y-%m-%d')
+        except ValueError:
+            return None
+    if hasattr(date, 'year') and hasattr(date, 'month'):
+        return date.year, date.month
+    return None
+
+# Dependencies read by the page being rendered in this thread, or None outside render_page
+dependency_log = contextvars.ContextVar('dependency_log', default=None)
+
+def record_dependency(dependency):
+    """Note that the page being rendered read dependency"""
+    log = dependency_log.get()
+    if log is not None:
+        log.add(dependency)
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache "name" %}...{% endcache %} renders a block once per build and reuses it on
+    every page, for site-wide chrome such as the nav and footer. The key (the template
+    name plus any expressions given) must capture everything the block varies by.
+    The block's recorded dependencies are replayed for every page that reuses it.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_memo={})
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [nodes.Const(parser.name), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached_fragment', [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, key, caller):
+        key = tuple(key)
+        memo = self.environment.fragment_memo
+        cached = memo.get(key)
+        if cached is None:
+            token = dependency_log.set(set())
+            try:
+                html = caller()
+                recorded = dependency_log.get()
+            finally:
+                dependency_log.reset(token)
+            cached = memo[key] = (html, recorded)
+        log = dependency_log.get()
+        if log is not None:
+            log.update(cached[1])
+        return cached[0]
+
+class TrackedDict(dict):
+    """dict that records which keys templates read, so each output's dependency on
+    individual config keys or tag fields is known after it renders"""
+    __slots__ = ('label',)
+
+    def __init__(self, label, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = label
+
+    def __getitem__(self, key):
+        record_dependency((self.label, key))
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        record_dependency((self.label, key))
+        return super().get(key, default)
+
+    def __iter__(self):
+        record_dependency((self.label, '*'))
+        return super().__iter__()
+
+    def keys(self):
+        record_dependency((self.label, '*'))
+        return super().keys()
+
+    def values(self):
+        record_dependency((self.label, '*'))
+        return super().values()
+
+    def items(self):
+        record_dependency((self.label, '*'))
+        return super().items()
+
+class TrackedList(list):
+    """list that records whether templates read it at all (e.g. the full post list)"""
+    __slots__ = ('label',)
+
+    def __init__(self, label, *args):
+        super().__init__(*args)
+        self.label = label
+
+    def __iter__(self):
+        record_dependency((self.label,))
+        return super().__iter__()
+
+    def __len__(self):
+        record_dependency((self.label,))
+        return super().__len__()
+
+    def __getitem__(self, index):
+        record_dependency((self.label,))
+        return super().__getitem__(index)
+
+def template_digests(env, names):
+    """
+    Digest of each named template together with every template it extends,
+    includes or imports, so editing a partial invalidates exactly its users.
+    """
+    sources = {}
+    references = {}
+
+    def load(name):
+        if name not in sources:
+            try:
+                sources[name] = env.loader.get_source(env, name)[0]
+                references[name] = set(meta.find_referenced_templates(env.parse(sources[name])))
+            except Exception:
+                sources[name] = ''
+                references[name] = set()
+        return references[name]
+
+    digests = {}
+    for name in names:
+        closure = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if current in closure:
+                continue
+            closure.add(current)
+            refs = load(current)
+            if None in refs:
+                # Dynamic include/extends: depend on every template
+                refs = set(env.list_templates())
+            pending.extend(refs)
+        h = hashlib.sha256()
+        for current in sorted(closure):
+            h.update(f"{current}\0{sources[current]}\0".encode('utf-8'))
+        digests[name] = h.hexdigest()
+    return digests
+
+def to_rfc2822(date):
+    """Format a post date for RSS, or '' if it has none"""
+    if hasattr(date, 'strftime'):
+        return date.strftime('%a, %d %b %Y 00:00:00 +0000')
+    if isinstance(date, str) and date:
+        try:
+            return datetime.strptime(date[:10], '%Y-%m-%d').strftime('%a, %d %b %Y 00:00:00 +0000')
+        except ValueError:
+            pass
+    return ''
+
+def sitemap_entries(site_url, tags_url, posts, nav_pages, processed_tags, archive_urls):
+    """Yield (loc, lastmod, priority) for every URL in the sitemap"""
+    yield f"{site_url}/", None, '1.0'
+    yield f"{site_url}{tags_url}", None, '0.5'
+    for post in posts:
+        date = post['date']
+        lastmod = None
+        if hasattr(date, 'strftime'):
+            lastmod = date.strftime('%Y-%m-%d')
+        elif isinstance(date, str) and date:
+            lastmod = date[:10]
+        yield f"{site_url}{post['url']}", lastmod, '0.8'
+    for page in nav_pages:
+        yield f"{site_url}{page['url']}", None, '0.6'
+    for tag in processed_tags.values():
+        yield f"{site_url}{tag['url']}", None, '0.5'
+    for url in archive_urls:
+        yield f"{site_url}{url}", None, '0.4'
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far in MiB, or None where it cannot be measured"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+class BuildProfile:
+    """Wall time per build phase plus per-source, per-page and per-template timings, reported by --profile"""
+
+    def __init__(self, config_seconds=0):
+        self.phases = [{'phase': 'config', 'seconds': config_seconds, 'peak_rss_mb': peak_rss_mb()}]
+        self.directories = {}
+        self.sources = []
+        self.pages = []
+        self.skipped = defaultdict(int)
+        self.total_seconds = config_seconds
+        self.last_lap = time.perf_counter()
+
+    def lap(self, name, **counts):
+        """Record the time since the previous lap as phase name"""
+        now = time.perf_counter()
+        self.phases.append({'phase': name, 'seconds': now - self.last_lap, 'peak_rss_mb': peak_rss_mb(), **counts})
+        self.total_seconds += now - self.last_lap
+        self.last_lap = now
+
+    def record_source(self, directory, path, seconds):
+        stats = self.directories.setdefault(directory, {'files': 0, 'seconds': 0.0})
+        stats['files'] += 1
+        stats['seconds'] += seconds
+        self.sources.append((seconds, path))
+
+    def record_page(self, kind, template, url, seconds):
+        self.pages.append((seconds, kind, template, url))
+
+    def report(self, top=10):
+        """The profile as a JSON-serializable dict, with the top slowest sources and pages"""
+        kinds, templates = {}, {}
+        for seconds, kind, template, _ in self.pages:
+            for group, name in ((kinds, kind), (templates, template)):
+                stats = group.setdefault(name, {'pages': 0, 'seconds': 0.0})
+                stats['pages'] += 1
+                stats['seconds'] += seconds
+        for kind, count in self.skipped.items():
+            kinds.setdefault(kind, {'pages': 0, 'seconds': 0.0})['skipped'] = count
+        return {
+            'total_seconds': self.total_seconds,
+            'phases': self.phases,
+            'directories': self.directories,
+            'render': kinds,
+            'templates': templates,
+            'slowest_sources': [{'path': path, 'seconds': seconds}
+                                for seconds, path in heapq.nlargest(top, self.sources)],
+            'slowest_pages': [{'url': url, 'template': template, 'seconds': seconds}
+                              for seconds, _, template, url in heapq.nlargest(top, self.pages)],
+        }
+
+    def print_report(self, top=10):
+        report = self.report(top)
+        print(f"\nBuild profile ({report['total_seconds']:.3f}s)")
+        for phase in report['phases']:
+            counts = ', '.join(f"{key} {value}" for key, value in phase.items() if key not in ('phase', 'seconds', 'peak_rss_mb'))
+            rss = f"{phase['peak_rss_mb']:>8.1f} MiB" if phase['peak_rss_mb'] is not None else ''
+            print(f"  {phase['phase']:<22}{phase['seconds']:>9.3f}s{rss}  {counts}".rstrip())
+        sections = (('Markdown ingest (summed per file)', report['directories'], 'files'),
+                    ('Render by kind (summed per page)', report['render'], 'pages'),
+                    ('Render by template (summed per page)', report['templates'], 'pages'))
+        for title, group, unit in sections:
+            if group:
+                print(f"  {title}:")
+                for name, stats in group.items():
+                    skipped = f", {stats['skipped']} skipped" if stats.get('skipped') else ''
+                    print(f"    {name:<20}{stats['seconds']:>9.3f}s  {stats[unit]} {unit}{skipped}")
+        for title, rows, label in (('Slowest sources', report['slowest_sources'], 'path'),
+                                   ('Slowest pages', report['slowest_pages'], 'url')):
+            if rows:
+                print(f"  {title}:")
+                for row in rows:
+                    print(f"    {row['seconds']:>9.3f}s  {row[label]}")
+
+# Bump when search terms are extracted differently, so every post is re-indexed
+SEARCH_VERSION = 1
+
+SEARCH_DIR = 'search'
+
+SEARCH_STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split())
+
+_SEARCH_TERM_RE = re.compile(r'[^\W_]+')
+
+def search_terms(text):
+    """Lowercased index terms of text. search.js tokenizes queries the same way."""
+    return [term for term in _SEARCH_TERM_RE.findall(text.lower())
+            if len(term) > 1 and term not in SEARCH_STOP_WORDS]
+
+# Outputs worth precompressing, and the share of their size compression must save
+PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.json', '.xml', '.txt', '.svg')
+
+PRECOMPRESS_MIN_SAVING = 0.1
+
+def brotli_available():
+    return importlib.util.find_spec('brotli') is not None
+
+MANIFEST_NAME = 'manifest.json'
+
+def file_sha256(path):
+    """Hash a file's bytes"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Builders by token, so the bound methods a build sends to its worker processes resolve
+# to one builder per process: the forked copy of the parent's, or one rebuilt from its config
+_worker_builders = weakref.WeakValueDictionary()
+_rebuilt_builders = {}
+
+class BuildCaches:
+    """
+    In-memory caches that only depend on source files, shared by every Builder given the
+    same instance: parsed documents and front matter keyed by path and file signature,
+    image dimensions, and per-thread markdown converters. Safe to share between builders
+    running in different threads.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.front_matter = {}
+        self.image_sizes = {}
+        self.local = threading.local()
+
+    @property
+    def markdown_converters(self):
+        """This thread's converters; a converter is not safe to use from two threads at once"""
+        converters = getattr(self.local, 'converters', None)
+        if converters is None:
+            converters = self.local.converters = {}
+        return converters
+
+    def clear(self):
+        self.documents.clear()
+        self.front_matter.clear()
+        self.image_sizes.clear()
+
+class Builder:
+    """
+    Builds one site from a config dict. All build state lives on the instance, so a
+    long-running process can keep builders warm between builds and build several sites
+    one after another or from different threads. Relative paths in the config are resolved
+    against root when given, else against the working directory. Builders constructed
+    with the same BuildCaches share their parsed sources.
+    """
+
+    def __init__(self, config, root=None, caches=None):
+        self.config = {**DEFAULT_CONFIG, **config}
+        self.root = os.path.abspath(root) if root is not None else None
+        if self.root is not None:
+            for key in PATH_KEYS:
+                if self.config.get(key):
+                    self.config[key] = os.path.join(self.root, self.config[key])
+        self.caches = caches if caches is not None else BuildCaches()
+        self.config_load_seconds = 0
+        # Identifies this builder to the worker processes of its builds
+        self.token = uuid.uuid4().hex
+        _worker_builders[self.token] = self
+
+        self._content_store = None
+        self._excerpt_memo = {}
+        self._md_memo = {}
+        self._created_dirs = set()
+        self._writer = None
+        self._render_state = None
+        self._environments = {}
+        self._image_index = {}
+        self._asset_hash_memo = {}
+        self._assets = {}
+        self._profile = None
+
+    @classmethod
+    def from_file(cls, config_path='config.yaml', root=None, caches=None):
+        """A builder for the config file at config_path"""
+        start = time.perf_counter()
+        builder = cls(load_config(config_path), root=root, caches=caches)
+        builder.config_load_seconds = time.perf_counter() - start
+        return builder
+
+    def __reduce__(self):
+        # Worker processes get the config and rebuild their state through the stage's initializer
+        return _worker_builder, (self.token, self.config, self.root)
+
+    def path(self, path):
+        """A config path that is not in PATH_KEYS, resolved against root"""
+        return os.path.join(self.root, path) if self.root is not None and path else path
+
+    def build(self):
+        """Build the site. Returns the build's BuildProfile."""
+        return self.build_site()
+
+    def markdown_backend_class(self):
+        """The converter class selected by markdown_backend"""
+        name = self.config['markdown_backend']
+        if name in MARKDOWN_BACKENDS:
+            return MARKDOWN_BACKENDS[name]
+        if ':' in name:
+            module_name, class_name = name.split(':', 1)
+            return getattr(importlib.import_module(module_name), class_name)
+        raise ValueError(f"Unknown markdown_backend: {name} (expected one of {', '.join(MARKDOWN_BACKENDS)} or module:Class)")
+
+    def markdown_converter(self, extensions=MARKDOWN_EXTENSIONS):
+        """This process's reusable converter for the configured markdown_backend"""
+        key = (self.config['markdown_backend'], tuple(extensions))
+        converter = self.caches.markdown_converters.get(key)
+        if converter is None:
+            converter = self.caches.markdown_converters[key] = self.markdown_backend_class()(extensions)
+        return converter
+
+    def markdown_cache_key(self, text):
+        """Hash markdown source together with everything that affects its conversion"""
+        h = hashlib.sha256()
+        backend = self.markdown_backend_class()
+        h.update(f"{DSSSG_VERSION}\0{CACHE_VERSION}\0{backend.name}\0{backend.version()}\0{','.join(MARKDOWN_EXTENSIONS)}\0".encode('utf-8'))
+        h.update(text.encode('utf-8'))
+        return h.hexdigest()
+
+    def cache_entry_path(self, kind, key):
+        """Path of a build cache entry, or None if caching is disabled"""
+        if not self.config.get('cache_dir'):
+            return None
+        return os.path.join(self.config['cache_dir'], kind, key[:2], f"{key}.pickle")
+
+    def load_cache_entry(self, kind, key):
+        """Load a build cache entry, returning None on a miss or unreadable entry"""
+        path = self.cache_entry_path(kind, key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def store_cache_entry(self, kind, key, value):
+        """Write a build cache entry"""
+        path = self.cache_entry_path(kind, key)
+        if path is not None:
+            write_pickle(path, value)
+
+    def state_dir(self):
+        """
+        Where this site's build state lives: cache_dir/state/<site digest>, keyed by the resolved
+        content and output directories, so sites sharing a cache_dir keep separate state.
+        Content-keyed entries (converted Markdown, images, minified assets) stay shared.
+        """
+        site = '\0'.join(os.path.abspath(self.config[key]) if self.config.get(key) else ''
+                         for key in ('content_dir', 'nav_dir', 'root_dir', 'output_dir'))
+        digest = hashlib.sha256(site.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.config['cache_dir'], 'state', digest)
+
+    def load_build_state(self, name):
+        """Load state recorded by the previous build (e.g. page signatures), or {} if there is none"""
+        if not self.config.get('cache_dir'):
+            return {}
+        try:
+            with open(os.path.join(self.state_dir(), f"{name}.pickle"), 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return {}
+
+    def store_build_state(self, name, value):
+        """Record state for the next build"""
+        if self.config.get('cache_dir'):
+            write_pickle(os.path.join(self.state_dir(), f"{name}.pickle"), value)
+
+    def read_markdown_file(self, file_path):
+        """
+        Read markdown file, extract front matter, and process content.
+        Returns a document dict with the front matter, HTML, thumbnail and precomputed
+        excerpts. Results are cached on disk by content hash so unchanged files skip conversion.
+        """
+        stat = os.stat(file_path)
+        file_signature = (stat.st_mtime_ns, stat.st_size)
+        # Keyed by backend too, since builders sharing these caches may convert differently
+        memo_key = (file_path, self.config['markdown_backend'])
+        memo = self.caches.documents.get(memo_key)
+        if memo is not None and memo[0] == file_signature:
+            return memo[1]
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        key = self.markdown_cache_key(content)
+        cached = self.load_cache_entry('markdown', key)
+        if cached is not None:
+            if not self.config.get('low_memory'):
+                self.caches.documents[memo_key] = (file_signature, cached)
+            return cached
+
+        front_matter, content_without_front_matter = extract_front_matter(content)
+    
+        # Convert markdown to HTML
+        html_content = self.markdown_converter().convert(content_without_front_matter)
+    
+        # Process image captions
+        html_content = process_image_captions(html_content)
+
+        document = {
+            'source_hash': key,
+            'front_matter': front_matter,
+            'html': html_content,
+            'thumbnail': extract_thumbnail(html_content),
+            'excerpts': {length: html_excerpt(html_content, length) for length in EXCERPT_LENGTHS},
+        }
+        self.store_cache_entry('markdown', key, document)
+        if not self.config.get('low_memory'):
+            self.caches.documents[memo_key] = (file_signature, document)
+
+        return document
+
+    def ingest_markdown_file(self, file_path):
+        """
+        read_markdown_file plus responsive image markup, also returning the seconds it took (for --profile).
+        In low_memory builds the HTML goes to the content store and is returned as None.
+        """
+        start = time.perf_counter()
+        document = self.read_markdown_file(file_path)
+        if self._image_index:
+            # Dimensions and srcsets come from the images themselves, so they are added
+            # after the cached conversion and folded into the source hash
+            html_content, used = self.responsive_images(document['html'])
+            if used:
+                source_hash = hashlib.sha256(f"{document['source_hash']}\0{sorted(used.items())!r}".encode('utf-8')).hexdigest()
+                document = dict(document, html=html_content, source_hash=source_hash)
+        if self.config.get('low_memory'):
+            self.content_store().put(document['source_hash'], document['html'])
+            document = dict(document, html=None)
+        return document, time.perf_counter() - start
+
+    def content_store(self):
+        """The content store for low_memory builds: in cache_dir, or in the temp dir when caching is off"""
+        if self._content_store is None:
+            if self.config.get('cache_dir'):
+                path = os.path.join(self.state_dir(), 'content.sqlite')
+            else:
+                site = hashlib.sha256(os.path.abspath(self.config['output_dir']).encode('utf-8')).hexdigest()[:16]
+                path = os.path.join(tempfile.gettempdir(), f"dsssg-content-{site}.sqlite")
+            self._content_store = ContentStore(path)
+        return self._content_store
+
+    def html_ext(self, value, force=False):
+        """Append .html to value unless clean_urls is enabled or value already has a file extension.
+        Use force=True to always append .html regardless of clean_urls (for disk paths)."""
+        if '.' in os.path.basename(value):
+            return value
+        if not self.config.get('clean_urls') or force:
+            return value + '.html'
+        return value
+
+    def generate_nav_url(self, slug):
+        """Generate URL for a nav or root page"""
+        return self.html_ext(f"/{slug}")
+
+    def generate_post_url(self, slug):
+        """Generate URL for a post"""
+        return self.html_ext(f"/posts/{slug}")
+
+    def generate_tag_url(self, slug):
+        """Generate URL for a tag page"""
+        return self.html_ext(f"/tags/{slug}")
+
+    def generate_page_url(self, base, page):
+        """Generate URL for page 2+ of a paginated listing rooted at base"""
+        return self.html_ext(f"{base.rstrip('/')}/page/{page}")
+
+    def generate_archive_url(self, year, month=None):
+        """Generate URL for a year or month archive page"""
+        if month is None:
+            return self.html_ext(f"/archive/{year}")
+        return self.html_ext(f"/archive/{year}/{month:02d}")
+
+    def archive_url(self, date):
+        """Template global: the URL of the year archive a post date falls in, or None if it has no usable date"""
+        year_month = date_year_month(date)
+        return self.generate_archive_url(year_month[0]) if year_month else None
+
+    def load_tag_metadata(self):
+        """Load tag metadata from tags.yaml file if it exists"""
+        tags_metadata = {}
+    
+        tags_file_path = self.config['tags_file']
+        if os.path.exists(tags_file_path):
+            try:
+                with open(tags_file_path, 'r', encoding='utf-8') as f:
+                    tags_metadata = yaml.safe_load(f) or {}
+            except Exception as e:
+                print(f"Error loading tags metadata: {e}")
+    
+        return tags_metadata
+
+    def process_tag(self, tag_name, tags_metadata):
+        """Process a tag with its metadata"""
+        # Get metadata for this tag (or empty dict if not found)
+        metadata = tags_metadata.get(tag_name, {})
+    
+        # Default slug is the tag name in lowercase with spaces replaced by hyphens
+        slug = sys.intern(tag_name.lower().replace(' ', '-'))
+    
+        # Create a tag object with default values
+        tag = {
+            'name': tag_name,
+            'slug': slug,
+            'display_name': metadata.get('display_name', tag_name),
+            'description': metadata.get('description', ''),
+            'color': metadata.get('color', None),
+            'url': self.generate_tag_url(slug),
+            'feed_url': generate_tag_feed_url(slug) if self.config['tag_feeds'] else None,
+        }
+    
+        return tag
+
+    def remember_excerpts(self, html_content, excerpts):
+        """Register a post's precomputed excerpts so the template filters reuse them"""
+        if html_content is None or isinstance(html_content, SpilledContent):
+            return
+        for length, excerpt in excerpts.items():
+            self._excerpt_memo[(html_content, length)] = excerpt
+
+    def striptags_excerpt(self, value):
+        """Strip all HTML tags except <pre> blocks and hyperlinks. Removes figures entirely."""
+        if value is None:
+            return ''
+        if isinstance(value, SpilledContent):
+            return SpilledExcerpt(value)
+        stripped = self._excerpt_memo.get((value, None))
+        if stripped is None:
+            stripped = StrippedExcerpt(html_excerpt(value))
+            stripped.source = value
+            self._excerpt_memo[(value, None)] = stripped
+        return stripped
+
+    def safe_html_truncate(self, html_content, length=700):
+        """
+        Safely truncate HTML content to approximately 'length' characters
+        while preserving valid HTML structure. Pre/code blocks are always
+        included whole and count as 50 chars toward the budget.
+        """
+        source = getattr(html_content, 'source', None)
+        if source is None:
+            return html_excerpt(html_content, length, strip=False)
+        if isinstance(source, SpilledContent):
+            excerpt = source.excerpts.get(length)
+            return excerpt if excerpt is not None else html_excerpt(str(source), length)
+        excerpt = self._excerpt_memo.get((source, length))
+        if excerpt is None:
+            excerpt = self._excerpt_memo[(source, length)] = html_excerpt(source, length)
+        return excerpt
+
+    def markdown_filter(self, text):
+        """Convert a short Markdown string (e.g. a footer item) without extensions"""
+        text = str(text)
+        html = self._md_memo.get(text)
+        if html is None:
+            html = self._md_memo[text] = self.markdown_converter(extensions=()).convert(text)
+        return html
+
+    def create_environment(self, now=None):
+        """Set up the Jinja2 template environment with dsssg's filters and globals"""
+        bytecode_cache = None
+        if self.config.get('cache_dir'):
+            # Compiled templates persist across builds; Jinja recompiles any template whose source changed.
+            # They refer to the {% cache %} extension by import path, so are kept per path.
+            bytecode_dir = os.path.join(self.config['cache_dir'], 'jinja', FragmentCacheExtension.identifier)
+            os.makedirs(bytecode_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+        env = Environment(loader=FileSystemLoader(self.config['template_dir']),
+                          extensions=[FragmentCacheExtension], bytecode_cache=bytecode_cache)
+        env.filters['date'] = date_filter
+        env.filters['safe_truncate'] = self.safe_html_truncate
+        env.filters['regex_replace'] = regex_replace
+        env.filters['striptags_excerpt'] = self.striptags_excerpt
+        env.filters['md'] = self.markdown_filter
+
+        # Add current date to templates
+        env.globals['now'] = now or datetime.now()
+        env.globals['tags_url'] = self.html_ext('/tags')
+        env.globals['archive_url'] = self.archive_url
+        env.globals['image_attrs'] = self.image_attrs
+        env.globals['asset'] = self.asset
+        return env
+
+    def read_front_matter(self, file_path):
+        """
+        Read only the front matter block at the top of a markdown file, without
+        converting the body, so content can be indexed and filtered before the
+        expensive Markdown conversion.
+        """
+        stat = os.stat(file_path)
+        file_signature = (stat.st_mtime_ns, stat.st_size)
+        memo = self.caches.front_matter.get(file_path)
+        if memo is not None and memo[0] == file_signature:
+            return memo[1]
+
+        lines = []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            first = f.readline()
+            if first.rstrip() == '---' and first.endswith('\n'):
+                lines.append(first)
+                for line in f:
+                    lines.append(line)
+                    if line.rstrip() == '---' and line.endswith('\n'):
+                        break
+        front_matter = extract_front_matter(''.join(lines))[0] if lines else {}
+        front_matter = front_matter if isinstance(front_matter, dict) else {}
+        self.caches.front_matter[file_path] = (file_signature, front_matter)
+        return front_matter
+
+    def selected_for_build(self, file_path, front_matter):
+        """True if a post passes the --only and --since filters of a partial build"""
+        only = self.config.get('only')
+        if only:
+            slug = os.path.splitext(os.path.basename(file_path))[0]
+            # Patterns are relative to the working directory, or to root when one is set
+            path = os.path.normpath(os.path.relpath(file_path, self.root) if self.root is not None else file_path)
+            if not any(fnmatch.fnmatch(path, os.path.normpath(pattern)) or fnmatch.fnmatch(slug, pattern)
+                       for pattern in only):
+                return False
+        since = self.config.get('since')
+        if since:
+            return str(get_post_date(front_matter))[:10] >= str(since)
+        return True
+
+    def build_jobs(self):
+        """Number of worker processes to use; build_jobs <= 0 means one per CPU core"""
+        jobs = self.config.get('build_jobs')
+        if jobs is None:
+            return 1
+        if jobs <= 0:
+            return os.cpu_count() or 1
+        return jobs
+
+    def run_jobs(self, func, items, initializer=None, initargs=()):
+        """
+        Apply func to every item, fanning out to a process pool when build_jobs > 1.
+        Results are returned in input order, so parallel and serial builds merge identically.
+        """
+        items = list(items)
+        jobs = min(self.build_jobs(), len(items))
+        if jobs <= 1:
+            if initializer is not None:
+                initializer(*initargs)
+            return [func(item) for item in items]
+        chunksize = max(1, len(items) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+            return list(pool.map(func, items, chunksize=chunksize))
+
+    def output_path_for(self, url):
+        """Path under output_dir that a page URL is written to"""
+        return os.path.join(self.config['output_dir'], self.html_ext(url, force=True).lstrip('/'))
+
+    def remove_output(self, path):
+        """
+        Delete an output this build no longer generates, with its precompressed siblings and
+        any directories left empty, so it also drops out of manifest.json and gets deleted on deploy.
+        """
+        for stale in (path, path + '.gz', path + '.br'):
+            if os.path.exists(stale):
+                os.remove(stale)
+        output_dir = os.path.abspath(self.config['output_dir'])
+        directory = os.path.dirname(os.path.abspath(path))
+        while directory.startswith(output_dir + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            self._created_dirs.clear()
+            directory = os.path.dirname(directory)
+
+    def ensure_dir(self, directory):
+        """Create directory (and parents) unless this build already has"""
+        if directory not in self._created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def write_if_changed(self, path, data):
+        """
+        Write bytes to path unless it already holds exactly those bytes, so unchanged outputs
+        keep their mtime. The data goes to a temporary file that is renamed into place, so a
+        reader never sees a half-written file. Returns True if written.
+        """
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, 'rb') as f:
+                    if f.read() == data:
+                        return False
+        except OSError:
+            pass
+        self.ensure_dir(os.path.dirname(path))
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def write_page(self, url, html):
+        """Write a rendered page to its path under output_dir if its content changed"""
+        path = self.output_path_for(url)
+        if self._writer is not None:
+            self._writer.submit(path, html.encode('utf-8'))
+        else:
+            self.write_if_changed(path, html.encode('utf-8'))
+
+    def minified(self, kind, text):
+        """Minify a static asset's text with the 'css' or 'js' minifier, cached in cache_dir by input hash"""
+        key = hashlib.sha256(f"{MINIFY_VERSION}\0{kind}\0{text}".encode('utf-8')).hexdigest()
+        result = self.load_cache_entry('minify', key)
+        if result is None:
+            result = MINIFIERS[kind](text)
+            self.store_cache_entry('minify', key, result)
+        return result
+
+    def minify_asset(self, job):
+        """Write a minified copy of a static CSS or JS file. Returns True if written."""
+        dst_path, src_path = job
+        with open(src_path, 'rb') as f:
+            data = f.read()
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return self.write_if_changed(dst_path, data)
+        kind = os.path.splitext(src_path)[1].lower().lstrip('.')
+        return self.write_if_changed(dst_path, self.minified(kind, text).encode('utf-8'))
+
+    def init_render_worker(self, state):
+        """Give a render worker (or the main process) the data shared by every page"""
+        env_key = (self.config['template_dir'], self.config.get('clean_urls'))
+        env = self._environments.get(env_key)
+        if env is None:
+            env = self._environments[env_key] = self.create_environment()
+        env.fragment_memo.clear()
+        env.globals['now'] = state['now']
+        env.globals['nav_pages'] = state['nav_pages']
+        self.set_image_index(state['image_index'])
+        self._assets.clear()
+        self._assets.update(state['assets'])
+        for post in state['pages'] + state['posts']:
+            self.remember_excerpts(post['content'], post['excerpts'])
+        self._render_state = dict(state, env=env,
+                                  site=TrackedDict('config', self.config),
+                                  tracked_posts=TrackedList('posts', state['posts']),
+                                  all_tags_list=TrackedList('tags', state['all_tags_list']))
+
+    def render_page(self, task):
+        """
+        Render and write a single page described by a (kind, key) task.
+        Returns the page URL, the config keys, tag fields and lists the templates read,
+        and the seconds spent rendering and writing it.
+        """
+        start = time.perf_counter()
+        kind, key = task
+        state = self._render_state
+        env = state['env']
+        site = state['site']
+        all_tags_list = state['all_tags_list']
+        token = dependency_log.set(set())
+        try:
+            if kind == 'page':
+                post = state['pages'][key]
+                url = post['url']
+                html = env.get_template(self.config['post_template']).render(post=post, site=site, tags=all_tags_list)
+            elif kind == 'post':
+                post = state['posts'][key]
+                url = post['url']
+                html = env.get_template(self.config['post_template']).render(post=post, site=site, posts=state['tracked_posts'], tags=all_tags_list, related_posts=state['related_posts'][key])
+            elif kind == 'listing':
+                listing = state['listings'][key]
+                url = listing['path']
+                html = env.get_template(listing['template']).render(posts=listing['posts'], site=site, tags=all_tags_list,
+                                                                    pagination=listing['pagination'], **listing['context'])
+            elif kind == 'tags':
+                url = 'tags.html'
+                html = env.get_template(self.config['tags_template']).render(posts=state['tracked_posts'], site=site, tags=all_tags_list)
+            else:
+                raise ValueError(f"Unknown render task: {kind}")
+            dependencies = tuple(sorted(dependency_log.get(), key=repr))
+        finally:
+            dependency_log.reset(token)
+        if self.config['minify']:
+            # Pages are only re-rendered when their content changed, so a content-keyed cache would never hit
+            html = minify_html(html)
+        self.write_page(url, html)
+        return url, dependencies, time.perf_counter() - start
+
+    def image_settings(self):
+        """Every setting that affects how an image is encoded"""
+        from PIL import __version__ as pillow_version
+        return f"{pillow_version}\0{self.config['image_max_width']}\0{self.config['image_quality']}\0"
+
+    def image_cache_key(self, src_path):
+        """Hash an image's bytes together with every setting that affects its encoding"""
+        h = hashlib.sha256()
+        h.update(self.image_settings().encode('utf-8'))
+        with open(src_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def image_formats(self):
+        """The extra image_formats (e.g. webp, avif) this Pillow build can encode, as extensions"""
+        from PIL import Image
+        supported = Image.registered_extensions()
+        extensions = []
+        for fmt in self.config.get('image_formats') or []:
+            ext = '.' + fmt.lower().lstrip('.')
+            if ext in IMAGE_MIME_TYPES and ext in supported and supported[ext] in Image.SAVE:
+                extensions.append(ext)
+        return extensions
+
+    def image_targets(self, rel_path, width):
+        """
+        Every file the image stage writes for an image of the given intrinsic width, as
+        [(rel_path, width, ext)]. The first is the image itself, resized to image_max_width.
+        Then come its narrower image_widths variants (name-480w.jpg), and all of them again
+        in each of image_formats (name.webp, name-480w.webp). GIFs and SVGs are only copied.
+        """
+        base, ext = os.path.splitext(rel_path)
+        ext = ext.lower()
+        if ext in COPIED_IMAGE_EXTENSIONS:
+            return [(rel_path, width, ext)]
+        main_width = min(width, self.config['image_max_width'])
+        widths = sorted({w for w in self.config.get('image_widths') or [] if w < main_width})
+        targets = [(rel_path, main_width, ext)] + [(f"{base}-{w}w{ext}", w, ext) for w in widths]
+        for format_ext in self.image_formats():
+            if format_ext == ext:
+                continue
+            targets.append((f"{base}{format_ext}", main_width, format_ext))
+            targets += [(f"{base}-{w}w{format_ext}", w, format_ext) for w in widths]
+        return targets
+
+    def image_size(self, src_path):
+        """(width, height) of an image, reading only its header"""
+        from PIL import Image
+        stat = os.stat(src_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        memo = self.caches.image_sizes.get(src_path)
+        if memo is None or memo[0] != signature:
+            with Image.open(src_path) as img:
+                memo = self.caches.image_sizes[src_path] = (signature, img.size)
+        return memo[1]
+
+    def build_image_index(self, images_dir):
+        """
+        Map the URL of every optimized image under images_dir to its output dimensions,
+        its srcset candidates and its extra-format sources, for responsive image markup.
+        Empty unless image_optimize is on.
+        """
+        source_dir = self.path(images_dir)
+        if not (self.config['image_optimize'] and images_dir and os.path.exists(source_dir)):
+            return {}
+        url_base = '/' + images_dir.strip('/').replace(os.sep, '/') + '/'
+        index = {}
+        for src_path in image_files(source_dir):
+            rel_path = os.path.relpath(src_path, source_dir).replace(os.sep, '/')
+            if rel_path.lower().endswith(('.svg', '.svgz')):
+                continue
+            try:
+                width, height = self.image_size(src_path)
+            except Exception:
+                continue
+            targets = self.image_targets(rel_path, width)
+            main_width = targets[0][1]
+            srcsets = defaultdict(list)
+            for target_path, target_width, ext in targets:
+                srcsets[ext if ext != targets[0][2] else None].append((url_base + target_path, target_width))
+            index[url_base + rel_path] = {
+                'width': main_width,
+                'height': int(height * (main_width / width)),
+                'srcset': srcsets.pop(None),
+                'sources': [(IMAGE_MIME_TYPES[ext], candidates) for ext, candidates in srcsets.items()],
+                'sizes': self.config['image_sizes'],
+            }
+        return index
+
+    def set_image_index(self, index):
+        """Give a worker (or the main process) the build's image index"""
+        self._image_index = index
+
+    def image_attrs(self, src):
+        """
+        Extra <img> attributes for an indexed image: width, height, srcset, sizes and
+        loading="lazy". Empty for any other image. Also a template global, e.g.
+        <img src="{{ post.thumbnail }}"{{ image_attrs(post.thumbnail) }}>.
+        """
+        record_dependency(('image', src))
+        entry = self._image_index.get(src)
+        if entry is None:
+            return ''
+        attrs = f' width="{entry["width"]}" height="{entry["height"]}"'
+        if len(entry['srcset']) > 1:
+            attrs += f' srcset="{srcset_attr(entry["srcset"])}" sizes="{entry["sizes"]}"'
+        return attrs + ' loading="lazy"'
+
+    def responsive_images(self, html_content):
+        """
+        Add dimensions, srcset and lazy loading to every indexed <img> in a document, wrapping
+        it in <picture> when extra formats exist. Returns the HTML and the index entries used.
+        """
+        used = {}
+
+        def rewrite(match):
+            attrs = match.group(1)
+            src = _SRC_ATTR_RE.search(attrs)
+            entry = self._image_index.get(src.group(1)) if src else None
+            if entry is None or ' width=' in attrs or ' srcset=' in attrs:
+                return match.group(0)
+            used[src.group(1)] = entry
+            img = f'<img{attrs}{self.image_attrs(src.group(1))} />'
+            if not entry['sources']:
+                return img
+            sources = ''.join(f'<source type="{mime}" srcset="{srcset_attr(candidates)}" sizes="{entry["sizes"]}">'
+                              for mime, candidates in entry['sources'])
+            return f'<picture>{sources}{img}</picture>'
+
+        return _IMG_TAG_RE.sub(rewrite, html_content), used
+
+    def encode_image(self, src_path, target_path, ext, width=None):
+        """Resize and re-encode a single image with Pillow"""
+        from PIL import Image
+        max_width = width or self.config['image_max_width']
+        with Image.open(src_path) as img:
+            if img.width > max_width:
+                ratio = max_width / img.width
+                img = img.resize((max_width, int(img.height * ratio)), Image.LANCZOS)
+            if ext in ('.jpg', '.jpeg'):
+                img.save(target_path, 'JPEG', quality=self.config['image_quality'], optimize=True)
+            elif ext == '.png':
+                img.save(target_path, 'PNG', optimize=True)
+            elif ext in IMAGE_MIME_TYPES:
+                img.save(target_path, Image.registered_extensions()[ext], quality=self.config['image_quality'])
+            else:
+                img.save(target_path, Image.registered_extensions()[ext])
+
+    def optimize_image(self, job):
+        """
+        Write every target of one image (see image_targets) into the output directory.
+        Encodes are kept in cache_dir, keyed by source hash, encoding settings and target
+        width and format, so a wiped output_dir or a reverted setting restores files by
+        copying instead of re-encoding. The job carries the image's cache key, or None when
+        caching is off. Returns (src_path, status, seconds).
+        """
+        src_path, base_key, targets = job
+        start = time.perf_counter()
+        statuses = set()
+
+        for index, (dst_path, width, ext) in enumerate(targets):
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            if ext in COPIED_IMAGE_EXTENSIONS:
+                if not same_file_stat(src_path, dst_path):
+                    copy_file(src_path, dst_path)
+                    statuses.add('copied')
+                continue
+
+            if base_key is None:
+                if os.path.exists(dst_path) and os.path.getmtime(dst_path) >= os.path.getmtime(src_path):
+                    continue
+                try:
+                    self.encode_image(src_path, dst_path, ext, width)
+                    statuses.add('optimized')
+                except Exception:
+                    copy_file(src_path, dst_path)
+                    statuses.add('copied')
+                continue
+
+            # The image itself keeps the original cache key; variants extend it
+            key = base_key if index == 0 else hashlib.sha256(f"{base_key}\0{width}\0{ext}".encode('utf-8')).hexdigest()
+            cache_path = os.path.join(self.config['cache_dir'], 'images', key[:2], key + ext)
+            if os.path.exists(cache_path):
+                if not same_file_stat(cache_path, dst_path):
+                    copy_file(cache_path, dst_path)
+                    statuses.add('cached')
+                continue
+
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path[:-len(ext)]}.{os.getpid()}.tmp{ext}"
+            try:
+                self.encode_image(src_path, tmp_path, ext, width)
+                os.replace(tmp_path, cache_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                # Cache the source itself, so the next build restores it instead of retrying the encode
+                copy_file(src_path, cache_path)
+                if not same_file_stat(cache_path, dst_path):
+                    copy_file(cache_path, dst_path)
+                statuses.add('copied')
+                continue
+            copy_file(cache_path, dst_path)
+            statuses.add('optimized')
+
+        status = next((s for s in ('optimized', 'cached', 'copied') if s in statuses), 'unchanged')
+        return src_path, status, time.perf_counter() - start
+
+    def optimize_images(self, images_dir, output_images_dir):
+        """
+        Optimize every image under images_dir on the worker pool. Cache keys persist in cache_dir
+        by source size and mtime, so unchanged images are not re-read. Returns the number of
+        freshly encoded images.
+        """
+        caching = bool(self.config.get('cache_dir'))
+        previous = self.load_build_state('images')
+        settings = self.image_settings() if caching else None
+        keys = {}
+        jobs = []
+        for src_path in image_files(images_dir):
+            rel_path = os.path.relpath(src_path, images_dir)
+            ext = os.path.splitext(rel_path)[1].lower()
+            if ext in COPIED_IMAGE_EXTENSIONS:
+                jobs.append((src_path, None, [(os.path.join(output_images_dir, rel_path), None, ext)]))
+                continue
+            base_key = None
+            if caching:
+                stat = os.stat(src_path)
+                signature = (stat.st_size, stat.st_mtime_ns, settings)
+                entry = previous.get(src_path)
+                if entry is None or entry[0] != signature:
+                    entry = (signature, self.image_cache_key(src_path))
+                keys[src_path] = entry
+                base_key = entry[1]
+            try:
+                targets = self.image_targets(rel_path, self.image_size(src_path)[0])
+            except Exception:
+                # Unreadable images are only copied, by optimize_image's fallback
+                targets = [(rel_path, None, ext)]
+            jobs.append((src_path, base_key, [(os.path.join(output_images_dir, target_path), width, ext)
+                                              for target_path, width, ext in targets]))
+        if caching and keys != previous:
+            self.store_build_state('images', keys)
+
+        counts = defaultdict(int)
+        for src_path, status, seconds in self.run_jobs(self.optimize_image, jobs):
+            counts[status] += 1
+            if status == 'optimized':
+                print(f"  optimized: {src_path} ({seconds:.2f}s)")
+        if counts['cached']:
+            print(f"  restored {counts['cached']} optimized images from cache")
+        return counts['optimized']
+
+    def sync_files(self, mapping):
+        """
+        Copy each source file in {destination: source} whose destination is missing or differs
+        in size or mtime. With asset_hardlinks, files are hardlinked instead of copied.
+        """
+        copied = 0
+        for dst_path, src_path in mapping.items():
+            if same_file_stat(src_path, dst_path):
+                continue
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            copy_file(src_path, dst_path, link=self.config['asset_hardlinks'])
+            copied += 1
+        return copied
+
+    def static_files(self):
+        """Map every static asset to its destination under output_dir/static as {destination: source}"""
+        # Layer dsssg bundled static assets under the site's own, so a file the parent
+        # site overrides is copied once from its final source instead of twice per build
+        output_static = os.path.join(self.config['output_dir'], 'static')
+        mapping = {}
+        if os.path.exists(DSSSG_STATIC_DIR):
+            mapping.update(tree_files(DSSSG_STATIC_DIR, output_static))
+
+        # Site static assets (override dsssg defaults).
+        # images_dir is always excluded here — it is handled separately below.
+        static_dir = self.config['static_dir']
+        if os.path.exists(static_dir):
+            images_dir = self.config['images_dir']
+            top_level = None
+            if images_dir:
+                images_abs = os.path.abspath(self.path(images_dir))
+                static_abs = os.path.abspath(static_dir)
+                if images_abs.startswith(static_abs + os.sep):
+                    top_level = os.path.relpath(images_abs, static_abs).split(os.sep)[0]
+            mapping.update(tree_files(static_dir, output_static, skip_top_level=top_level))
+        return mapping
+
+    def asset_fingerprints(self, mapping):
+        """
+        Map the path of every static asset (relative to static/) to its fingerprinted path,
+        css/style.css -> css/style.3f9a0c2e.css. Empty unless fingerprint_assets is on.
+        Hashes persist in cache_dir, so only new or changed assets are re-read.
+        """
+        if not self.config['fingerprint_assets']:
+            return {}
+        if not self._asset_hash_memo:
+            self._asset_hash_memo.update(self.load_build_state('assets'))
+        output_static = os.path.join(self.config['output_dir'], 'static')
+        fingerprints = {}
+        changed = False
+        for dst_path, src_path in mapping.items():
+            if os.path.basename(dst_path).startswith('.'):
+                continue
+            stat = os.stat(src_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            memo = self._asset_hash_memo.get(src_path)
+            if memo is None or memo[0] != signature:
+                memo = self._asset_hash_memo[src_path] = (signature, file_sha256(src_path))
+                changed = True
+            rel_path = os.path.relpath(dst_path, output_static).replace(os.sep, '/')
+            base, ext = os.path.splitext(rel_path)
+            fingerprints[rel_path] = f"{base}.{memo[1][:8]}{ext}"
+        if changed:
+            self.store_build_state('assets', self._asset_hash_memo)
+        return dict(sorted(fingerprints.items()))
+
+    def asset(self, path):
+        """
+        Template global: the URL of a static asset, fingerprinted when fingerprint_assets is on,
+        e.g. {{ asset('css/style.css') }} -> /static/css/style.3f9a0c2e.css
+        """
+        path = path.lstrip('/')
+        record_dependency(('asset', path))
+        return '/static/' + self._assets.get(path, path)
+
+    def copy_assets(self):
+        """Sync static assets, files and images into output_dir. Returns the number of images optimized."""
+        mapping = self.static_files()
+
+        # Fingerprinted copies sit next to the originals, which stay for references
+        # such as url() in CSS; copies from earlier builds are removed once replaced
+        output_static = os.path.join(self.config['output_dir'], 'static')
+        fingerprints = self.asset_fingerprints(mapping)
+        for rel_path, fingerprinted in fingerprints.items():
+            mapping[os.path.join(output_static, fingerprinted)] = mapping[os.path.join(output_static, rel_path)]
+        asset_manifest_path = os.path.join(self.config['output_dir'], ASSET_MANIFEST_NAME)
+        try:
+            with open(asset_manifest_path, encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        for fingerprinted in set(previous.values()) - set(fingerprints.values()):
+            stale_path = os.path.join(output_static, fingerprinted)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        if fingerprints:
+            self.write_if_changed(asset_manifest_path, (json.dumps(fingerprints, indent=1) + '\n').encode('utf-8'))
+        elif os.path.exists(asset_manifest_path):
+            os.remove(asset_manifest_path)
+
+        # Static CSS and JS are written minified on the worker pool instead of copied
+        minify_jobs = []
+        if self.config['minify']:
+            minify_jobs = sorted((dst_path, src_path) for dst_path, src_path in mapping.items()
+                                 if dst_path.lower().endswith(('.css', '.js')))
+            for dst_path, _ in minify_jobs:
+                del mapping[dst_path]
+        minified_count = sum(self.run_jobs(self.minify_asset, minify_jobs))
+
+        # Files directory
+        files_dir = self.config['files_dir']
+        if files_dir and os.path.exists(files_dir):
+            mapping.update(tree_files(files_dir, os.path.join(self.config['output_dir'], 'files')))
+        copied = self.sync_files(mapping) + minified_count
+        self.profile_lap('static copy', files=len(mapping) + len(minify_jobs), copied=copied)
+
+        # Copy and optimize site images
+        images_optimized = 0
+        images_dir = self.config['images_dir']
+        if images_dir and os.path.exists(self.path(images_dir)):
+            output_images_dir = os.path.join(self.config['output_dir'], images_dir)
+            if self.config['image_optimize']:
+                images_optimized = self.optimize_images(self.path(images_dir), output_images_dir)
+            else:
+                self.sync_files(tree_files(self.path(images_dir), output_images_dir))
+            self.profile_lap('images', optimized=images_optimized)
+
+        return images_optimized
+
+    def paginate(self, posts, base_url):
+        """
+        Split posts into listing pages of posts_per_page posts. Page 1 lives at base_url,
+        later pages at {base_url}/page/N. Returns (url, page_posts, pagination) tuples;
+        pagination is None when posts_per_page is not set.
+        """
+        per_page = self.config.get('posts_per_page')
+        if not per_page:
+            return [(base_url, posts, None)]
+        chunks = [posts[i:i + per_page] for i in range(0, len(posts), per_page)] or [[]]
+        base = base_url[:-len('.html')] if base_url.endswith('.html') else base_url
+        urls = [base_url] + [self.generate_page_url(base, page) for page in range(2, len(chunks) + 1)]
+        pages = []
+        for i, chunk in enumerate(chunks):
+            pagination = {
+                'page': i + 1,
+                'pages': len(chunks),
+                'total_posts': len(posts),
+                'url': urls[i],
+                'prev_url': urls[i - 1] if i > 0 else None,
+                'next_url': urls[i + 1] if i + 1 < len(chunks) else None,
+            }
+            pages.append((urls[i], chunk, pagination))
+        return pages
+
+    def build_listings(self, posts, tags_to_posts, processed_tags):
+        """Collect the paginated index, tag and (optional) date archive pages to render"""
+        listings = []
+
+        def add(template, base_url, listing_posts, context, first_path=None):
+            for i, (url, page_posts, pagination) in enumerate(self.paginate(listing_posts, base_url)):
+                listings.append({
+                    'path': first_path if i == 0 and first_path else url,
+                    'template': template,
+                    'posts': page_posts,
+                    'pagination': pagination,
+                    'context': context,
+                })
+
+        add(self.config['index_template'], '/', posts, {}, first_path='index.html')
+        for tag_name, tag_posts in tags_to_posts.items():
+            tag = processed_tags[tag_name]
+            add(self.config['tag_template'], tag['url'], tag_posts, {'tag': tag})
+
+        if self.config.get('archives'):
+            by_year = defaultdict(list)
+            by_month = defaultdict(list)
+            for post in posts:
+                year_month = post_year_month(post)
+                if year_month:
+                    by_year[year_month[0]].append(post)
+                    by_month[year_month].append(post)
+            for year, year_posts in by_year.items():
+                months = [{
+                    'title': datetime(year, month, 1).strftime('%B %Y'),
+                    'url': self.generate_archive_url(year, month),
+                    'count': len(by_month[(year, month)]),
+                } for month in sorted({m for y, m in by_month if y == year}, reverse=True)]
+                archive = {'year': year, 'month': None, 'title': str(year),
+                           'url': self.generate_archive_url(year), 'months': months}
+                add(self.config['archive_template'], archive['url'], year_posts, {'archive': archive})
+            for (year, month), month_posts in by_month.items():
+                archive = {'year': year, 'month': month, 'title': datetime(year, month, 1).strftime('%B %Y'),
+                           'url': self.generate_archive_url(year, month), 'months': []}
+                add(self.config['archive_template'], archive['url'], month_posts, {'archive': archive})
+        return listings
+
+    @contextlib.contextmanager
+    def output_stream(self, rel_path):
+        """
+        Open a file under output_dir for streamed text output. The content goes to a
+        temporary file that only replaces the output if it differs, so unchanged
+        outputs keep their mtime like write_page.
+        """
+        path = os.path.join(self.config['output_dir'], rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                yield f
+            if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def write_sitemap(self, site_url, posts, nav_pages, processed_tags, listings):
+        """
+        Stream sitemap.xml to disk. Past sitemap_max_urls URLs the entries are split
+        into sitemap-1.xml, sitemap-2.xml, ... and sitemap.xml becomes a sitemap index.
+        """
+        max_urls = max(1, self.config['sitemap_max_urls'])
+        # The first page of every year and month archive
+        archive_urls = list(dict.fromkeys(listing['context']['archive']['url']
+                                          for listing in listings if 'archive' in listing['context']))
+        total = 2 + len(posts) + len(nav_pages) + len(processed_tags) + len(archive_urls)
+        shards = 1 if total <= max_urls else math.ceil(total / max_urls)
+        entries = sitemap_entries(site_url, self.html_ext('/tags'), posts, nav_pages, processed_tags, archive_urls)
+
+        def write_urlset(rel_path, count):
+            with self.output_stream(rel_path) as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+                for loc, lastmod, priority in itertools.islice(entries, count):
+                    f.write(f"\n  <url>\n    <loc>{loc}</loc>")
+                    if lastmod:
+                        f.write(f"\n    <lastmod>{lastmod}</lastmod>")
+                    f.write(f"\n    <priority>{priority}</priority>\n  </url>")
+                f.write('\n</urlset>')
+
+        if shards == 1:
+            write_urlset('sitemap.xml', total)
+        else:
+            with self.output_stream('sitemap.xml') as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+                for shard in range(1, shards + 1):
+                    f.write(f"\n  <sitemap>\n    <loc>{site_url}/sitemap-{shard}.xml</loc>\n  </sitemap>")
+                f.write('\n</sitemapindex>')
+            for shard in range(1, shards + 1):
+                write_urlset(f"sitemap-{shard}.xml", max_urls)
+
+        # Remove shards left over from a build with more URLs
+        shard = shards + 1 if shards > 1 else 1
+        while os.path.exists(stale := os.path.join(self.config['output_dir'], f"sitemap-{shard}.xml")):
+            os.remove(stale)
+            shard += 1
+
+    def write_feed(self, rel_path, title, link, description, posts):
+        """
+        Stream an RSS feed of posts (newest first) to disk. rss_max_items caps the
+        number of items; with rss_full_content off, items carry the post excerpt.
+        """
+        site_url = self.config['site_url'].rstrip('/')
+        if self.config['rss_max_items']:
+            posts = posts[:self.config['rss_max_items']]
+        # The newest post date rather than the wall clock, so an unchanged feed stays byte-identical
+        last_build_date = next((to_rfc2822(post['date']) for post in posts if to_rfc2822(post['date'])), to_rfc2822(datetime.now()))
+        with self.output_stream(rel_path) as f:
+            f.write('\n'.join([
+                '<?xml version="1.0" encoding="UTF-8"?>',
+                '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">',
+                '  <channel>',
+                f'    <title>{title}</title>',
+                f'    <link>{link}</link>',
+                f'    <description>{description}</description>',
+                '    <language>en</language>',
+                f'    <lastBuildDate>{last_build_date}</lastBuildDate>',
+                f'    <atom:link href="{site_url}/{rel_path}" rel="self" type="application/rss+xml"/>',
+            ]))
+            for post in posts:
+                pub_date = to_rfc2822(post['date'])
+                post_url = f"{site_url}{post['url']}"
+                content = post['content'] if self.config['rss_full_content'] else self.safe_html_truncate(self.striptags_excerpt(post['content']))
+                f.write(f"\n    <item>\n      <title>{post['title']}</title>\n      <link>{post_url}</link>\n      <guid>{post_url}</guid>")
+                if pub_date:
+                    f.write(f"\n      <pubDate>{pub_date}</pubDate>")
+                f.write(f"\n      <description><![CDATA[{content}]]></description>\n    </item>")
+            f.write('\n  </channel>\n</rss>')
+
+    def profile_lap(self, name, **counts):
+        """Record the time since the previous lap as build phase name in the current profile"""
+        if self._profile is not None:
+            self._profile.lap(name, **counts)
+
+    def build_site(self):
+        """Build the site with tag support. Returns the build's BuildProfile."""
+        start_time = datetime.now()
+        self._profile = profile = BuildProfile(self.config_load_seconds)
+        self._excerpt_memo.clear()
+        self._md_memo.clear()
+        self._created_dirs.clear()
+
+        def process_markdown(file_path, document, is_nav=False, target=None):
+            # Generate slug from file name (without extension)
+            slug = os.path.splitext(os.path.basename(file_path))[0]
+            front_matter = document['front_matter']
+            html_content = document['html']
+
+            # Skip unpublished content
+            if front_matter.get('publish', True) is False:
+                return
+
+            # Get post title
+            title = front_matter.get('title', slug)
+
+            # Get post date
+            date = normalize_date(get_post_date(front_matter))
+
+            # Get tags (defaulting to empty list)
+            tags = front_matter.get('tags', [])
+
+            # If tags is a string, convert to list
+            if isinstance(tags, str):
+                tags = [tag.strip() for tag in tags.split(',')]
+            tags = [sys.intern(tag) if isinstance(tag, str) else tag for tag in tags]
+
+            # Track all tags used, in first-seen order so output is deterministic
+            all_tags.update(dict.fromkeys(tags))
+
+            # Create post object
+            post = Post(
+                title=title,
+                hide_title=front_matter.get('hide_title', False),
+                nav_order=front_matter.get('nav_order', None),
+                date=date,
+                updated=front_matter.get('updated', None),
+                tags=tags,
+                content=html_content if html_content is not None else SpilledContent(self.content_store(), document['source_hash'], document['excerpts']),
+                slug=slug,
+                url=self.generate_nav_url(slug) if is_nav else self.generate_post_url(slug),
+                thumbnail=document['thumbnail'],
+                excerpts=document['excerpts'],
+                source_hash=document['source_hash'],
+            )
+            self.remember_excerpts(html_content, post.excerpts)
+
+            if not is_nav:
+                posts.append(post)
+
+                # Add post to each of its tags
+                for tag in tags:
+                    tags_to_posts[tag].append(post)
+            else:
+                (target if target is not None else nav_pages).append(post)
+
+        # Ensure output directories exist
+        os.makedirs(self.config['output_dir'], exist_ok=True)
+        os.makedirs(os.path.join(self.config['output_dir'], 'tags'), exist_ok=True)
+        os.makedirs(os.path.join(self.config['output_dir'], 'posts'), exist_ok=True)
+
+        # Load tag metadata (if available)
+        tags_metadata = self.load_tag_metadata()
+        self.profile_lap('tag metadata', tags=len(tags_metadata))
+
+        # Collect all posts and organize by tags
+        posts = []
+        nav_pages = []
+        root_pages = []
+        tags_to_posts = defaultdict(list)
+        all_tags = {}
+
+        # Index every markdown file by its front matter alone, then convert only the
+        # published content this build emits (in parallel when build_jobs > 1), merging in walk order.
+        # Posts can be narrowed down with --only/--since; nav and root pages are always built.
+        partial = bool(self.config.get('only') or self.config.get('since'))
+        sources = [('content_dir', False, None), ('nav_dir', True, None)]
+        if os.path.exists(self.config['root_dir']):
+            sources.append(('root_dir', True, root_pages))
+        # The front matter index persists in cache_dir, so a cold process only re-parses changed files
+        previous_index = self.load_build_state('front_matter')
+        for file_path, entry in previous_index.items():
+            self.caches.front_matter.setdefault(file_path, entry)
+        front_matter_index = {}
+        source_files = []
+        for directory, is_nav, target in sources:
+            for file_path in find_markdown_files(self.config[directory]):
+                front_matter = self.read_front_matter(file_path)
+                front_matter_index[file_path] = self.caches.front_matter[file_path]
+                if front_matter.get('publish', True) is False:
+                    continue
+                if partial and not is_nav and not self.selected_for_build(file_path, front_matter):
+                    continue
+                source_files.append((file_path, directory, is_nav, target))
+        if front_matter_index != previous_index:
+            self.store_build_state('front_matter', front_matter_index)
+        self.profile_lap('front matter scan', files=len(front_matter_index), selected=len(source_files))
+        image_index = self.build_image_index(self.config['images_dir'])
+        results = self.run_jobs(self.ingest_markdown_file, [file_path for file_path, _, _, _ in source_files],
+                                initializer=self.set_image_index, initargs=(image_index,))
+        for (file_path, directory, is_nav, target), (result, seconds) in zip(source_files, results):
+            profile.record_source(directory, file_path, seconds)
+            process_markdown(file_path, result, is_nav=is_nav, target=target)
+        self.profile_lap('markdown ingest', files=len(source_files))
+
+        # Sort posts by date (newest first)
+        posts.sort(key=operator.attrgetter('sort_key'), reverse=True)
+        nav_pages.sort(key=lambda x: (x['nav_order'] is None, x['nav_order']))
+    
+        # Process tag objects for templates
+        processed_tags = {}
+    
+        for tag_name in all_tags:
+            tag_obj = TrackedDict(('tag', tag_name), self.process_tag(tag_name, tags_metadata))
+            tag_obj['count'] = len(tags_to_posts[tag_name])
+            processed_tags[tag_name] = tag_obj
+
+        all_tags_list = list(processed_tags.values())
+
+        for post in posts:
+            post.processed_tags = [processed_tags[t] for t in post.tags if t in processed_tags]
+        for tag_posts in tags_to_posts.values():
+            tag_posts.sort(key=operator.attrgetter('sort_key'), reverse=True)
+        self.profile_lap('tags', tags=len(processed_tags))
+
+        related_posts = compute_related_posts(posts, tags_to_posts, n=self.config['related_posts_count'],
+                                              weighting=self.config['related_posts_weighting'])
+        self.profile_lap('related posts', posts=len(posts))
+
+        # Render nav, root, post, listing (index, tag, archive) and tags overview pages.
+        # Each output's dependencies are recorded; pages whose dependencies are unchanged
+        # since the last build are not re-rendered.
+        listings = self.build_listings(posts, tags_to_posts, processed_tags)
+        self.profile_lap('listings', listings=len(listings))
+        pages = nav_pages + root_pages
+        candidates = [('page', i) for i in range(len(pages))]
+        candidates += [('post', i) for i in range(len(posts))]
+        candidates += [('listing', i) for i in range(len(listings))]
+        if os.path.exists(os.path.join(self.config['template_dir'], self.config['tags_template'])):
+            candidates.append(('tags', None))
+
+        templates = template_digests(self.create_environment(), {self.config['post_template'], self.config['tags_template'], *(listing['template'] for listing in listings)})
+        nav_digest = hashlib.sha256(repr([(page['url'], page['source_hash']) for page in nav_pages]).encode('utf-8')).hexdigest()
+        all_posts_digest = hashlib.sha256(repr([(post['url'], post['source_hash']) for post in posts]).encode('utf-8')).hexdigest()
+        all_tags_digest = hashlib.sha256(repr([dict(tag) for tag in all_tags_list]).encode('utf-8')).hexdigest()
+
+        def structure_digest(task):
+            """Digest of the inputs a page is built from: its template chain, the posts it shows and its place in the site"""
+            kind, key = task
+            if kind == 'page':
+                template, shown, identity = self.config['post_template'], [pages[key]], ()
+            elif kind == 'post':
+                template, shown = self.config['post_template'], [posts[key]] + related_posts[key]
+                identity = [tag['name'] for tag in posts[key]['processed_tags']]
+            elif kind == 'listing':
+                listing = listings[key]
+                template, shown = listing['template'], listing['posts']
+                context = listing['context']
+                identity = (listing['path'], listing['pagination'],
+                            context['tag']['name'] if 'tag' in context else None, context.get('archive'))
+            else:
+                template, shown, identity = self.config['tags_template'], [], ()
+            h = hashlib.sha256(f"{DSSSG_VERSION}\0{kind}\0{templates[template]}\0{nav_digest}\0".encode('utf-8'))
+            if self.config['minify']:
+                h.update(f"minify\0{MINIFY_VERSION}\0".encode('utf-8'))
+            h.update(repr(identity).encode('utf-8'))
+            for post in shown:
+                h.update(f"{post['url']}\0{post['source_hash']}\0".encode('utf-8'))
+            return h.hexdigest()
+
+        def dependency_value(dependency):
+            """Current value of a dependency recorded while rendering"""
+            label = dependency[0]
+            if label == 'posts':
+                return all_posts_digest
+            if label == 'tags':
+                return all_tags_digest
+            if label == 'image':
+                return repr(image_index.get(dependency[1]))
+            if label == 'asset':
+                return repr(assets.get(dependency[1]))
+            source = self.config if label == 'config' else processed_tags.get(label[1], {})
+            if dependency[1] == '*':
+                return dict.__repr__(source)
+            return repr(dict.get(source, dependency[1], '<missing>'))
+
+        def dependencies_digest(dependencies):
+            h = hashlib.sha256()
+            for dependency in dependencies:
+                h.update(f"{dependency!r}\0{dependency_value(dependency)}\0".encode('utf-8'))
+            return h.hexdigest()
+
+        def task_url(task):
+            kind, key = task
+            if kind == 'page':
+                return pages[key]['url']
+            if kind == 'post':
+                return posts[key]['url']
+            if kind == 'listing':
+                return listings[key]['path']
+            return 'tags.html'
+
+        assets = self.asset_fingerprints(self.static_files())
+        previous_graph = self.load_build_state('dependencies')
+        # A partial build keeps the records of the pages it leaves alone, so the next full
+        # build still skips every page that is really unchanged
+        dependency_graph = dict(previous_graph) if partial else {}
+        structures = {}
+        tasks = []
+        for task in candidates:
+            url = task_url(task)
+            structures[url] = structure_digest(task)
+            previous = previous_graph.get(url)
+            if (previous is not None and previous[0] == structures[url]
+                    and previous[2] == dependencies_digest(previous[1])
+                    and os.path.exists(self.output_path_for(url))):
+                dependency_graph[url] = previous
+                profile.skipped[task[0]] += 1
+            else:
+                tasks.append(task)
+        self.profile_lap('dependency check', pages=len(candidates), stale=len(tasks))
+
+        render_state = {
+            'now': datetime.now(),
+            'nav_pages': nav_pages,
+            'pages': pages,
+            'posts': posts,
+            'listings': listings,
+            'all_tags_list': all_tags_list,
+            'related_posts': related_posts,
+            'image_index': image_index,
+            'assets': assets,
+        }
+        def task_template(task):
+            kind, key = task
+            if kind == 'listing':
+                return listings[key]['template']
+            return self.config['tags_template'] if kind == 'tags' else self.config['post_template']
+
+        # Pages rendered in this process are written on write_threads background threads. Render
+        # workers write their own pages as they go, and are not forked from a process running threads.
+        in_process = min(self.build_jobs(), len(tasks)) <= 1
+        if in_process and self.config['write_threads'] > 0:
+            self._writer = OutputWriter(self.write_if_changed, self.config['write_threads'])
+        try:
+            results = self.run_jobs(self.render_page, tasks, initializer=self.init_render_worker, initargs=(render_state,))
+            for task, (url, dependencies, seconds) in zip(tasks, results):
+                dependency_graph[url] = (structures[url], dependencies, dependencies_digest(dependencies))
+                profile.record_page(task[0], task_template(task), url, seconds)
+        finally:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.close()
+        self.store_build_state('dependencies', dependency_graph)
+        if not partial:
+            # Pages of deleted posts, dropped tags and archives and vanished /page/N listings
+            for url in previous_graph.keys() - structures.keys():
+                self.remove_output(self.output_path_for(url))
+        self.profile_lap('render', pages=len(tasks))
+
+        # Generate sitemap.xml (split behind a sitemap index past sitemap_max_urls), robots.txt and feeds.
+        # A partial build would list only the selected posts, so it leaves them untouched.
+        if not partial:
+            site_url = self.config['site_url'].rstrip('/')
+            self.write_sitemap(site_url, posts, nav_pages, processed_tags, listings)
+            self.write_page('robots.txt', f"User-agent: *\nAllow: /\n\nSitemap: {site_url}/sitemap.xml\n")
+
+            self.write_feed('rss.xml', self.config['site_title'], f"{site_url}/", self.config['site_description'], posts)
+            feeds = ['rss.xml']
+            if self.config['tag_feeds']:
+                for tag_name, tag in processed_tags.items():
+                    feeds.append(tag['feed_url'].lstrip('/'))
+                    self.write_feed(feeds[-1], f"{self.config['site_title']} — {tag['display_name']}",
+                                    f"{site_url}{tag['url']}", tag['description'] or self.config['site_description'],
+                                    tags_to_posts[tag_name])
+            previous_feeds = self.load_build_state('feeds')
+            for rel_path in set(previous_feeds) - set(feeds):
+                self.remove_output(os.path.join(self.config['output_dir'], rel_path))
+            if feeds != previous_feeds:
+                self.store_build_state('feeds', feeds)
+            self.profile_lap('sitemap & feeds', urls=2 + len(posts) + len(nav_pages) + len(processed_tags))
+
+            if self.config['search']:
+                shards = self.write_search_index(posts)
+                self.profile_lap('search index', documents=len(posts), shards=shards)
+
+        images_optimized = self.copy_assets()
+        if self.config['precompress']:
+            compressed = self.precompress_outputs()
+            self.profile_lap('precompress', written=compressed)
+        if partial:
+            # Listings now show only the selected posts, so output_dir must not be deployed as is
+            manifest_path = os.path.join(self.config['output_dir'], MANIFEST_NAME)
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+        else:
+            manifest = self.write_manifest()
+            self.profile_lap('manifest', files=len(manifest))
+            if self.config['low_memory']:
+                self.content_store().prune(post['source_hash'] for post in posts + pages)
+        self._profile = None
+
+        elapsed = (datetime.now() - start_time).total_seconds()
+        images_str = f", and optimized {images_optimized} images" if images_optimized else ""
+        partial_str = " (partial build: run a full build before deploying)" if partial else ""
+        print(f"{self.config['site_title']} built successfully! Made {len(posts)} posts, {len(processed_tags)} tags{images_str} in {elapsed:.2f}s{partial_str}")
+        return profile
+
+    def post_search_terms(self, post):
+        """{term: weight} for one post: each occurrence counts 1 in the body, 2 in a tag and 5 in the title"""
+        weights = defaultdict(int)
+        body = html.unescape(re.sub(r'<[^>]+>', ' ', str(post['content'])))
+        for text, weight in ((body, 1), (' '.join(map(str, post['tags'])), 2), (str(post['title']), 5)):
+            for term in search_terms(text):
+                weights[term] += weight
+        return dict(weights)
+
+    def write_search_index(self, posts):
+        """
+        Write an inverted index of post titles, tags and body text for static/js/search.js.
+        search/index.json lists the documents and shards; search/{prefix}.json maps every term
+        starting with that prefix to [doc, weight, doc, weight, ...]. Document numbers follow
+        publication order, so a new post leaves existing shards untouched unless it shares
+        their terms. Terms are cached per post in cache_dir and only changed posts are
+        re-read. Returns the number of shards.
+        """
+        previous = self.load_build_state('search')
+        prefix_length = max(1, self.config['search_prefix_length'])
+        state = {}
+        documents = []
+        shards = defaultdict(lambda: defaultdict(list))
+        for number, post in enumerate(reversed(posts)):
+            key = hashlib.sha256(repr((SEARCH_VERSION, post['source_hash'], post['title'], post['tags'])).encode('utf-8')).hexdigest()
+            cached = previous.get(post['url'])
+            terms = cached[1] if cached is not None and cached[0] == key else self.post_search_terms(post)
+            state[post['url']] = (key, terms)
+            documents.append([post['url'], str(post['title']), date_filter(post['date'], self.config['date_format']) if post['date'] else ''])
+            for term, weight in terms.items():
+                shards[term[:prefix_length]][term] += [number, weight]
+        if state != previous:
+            self.store_build_state('search', state)
+
+        search_dir = os.path.join(self.config['output_dir'], SEARCH_DIR)
+        names = {f"{prefix}.json" for prefix in shards}
+        index = {'version': SEARCH_VERSION, 'prefix_length': prefix_length, 'documents': documents, 'shards': sorted(shards)}
+        self.write_if_changed(os.path.join(search_dir, 'index.json'), json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        for prefix, terms in shards.items():
+            shard = {term: terms[term] for term in sorted(terms)}
+            self.write_if_changed(os.path.join(search_dir, f"{prefix}.json"), json.dumps(shard, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+        # Remove shards of prefixes no post uses any more
+        for name in os.listdir(search_dir):
+            if name.endswith('.json') and name != 'index.json' and name not in names:
+                os.remove(os.path.join(search_dir, name))
+        return len(shards)
+
+    def precompress_file(self, path):
+        """
+        Write path.gz (and path.br when the brotli module is installed) next to an output, or
+        remove them when compression saves too little to be worth serving.
+        Returns the number written and the suffixes of the siblings kept.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        encoders = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli_available():
+            import brotli
+            encoders.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        written = 0
+        kept = []
+        for suffix, compress in encoders:
+            compressed = compress(data)
+            if len(compressed) <= len(data) * (1 - PRECOMPRESS_MIN_SAVING):
+                written += self.write_if_changed(path + suffix, compressed)
+                kept.append(suffix)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        return written, tuple(kept)
+
+    def precompress_outputs(self):
+        """
+        Precompress every text output in output_dir on the worker pool, for servers that serve
+        .gz/.br siblings as is (nginx gzip_static). Only outputs whose size or mtime changed since
+        the last build, or whose siblings went missing, are compressed again; siblings of outputs
+        that disappeared are removed.
+        Returns the number of compressed files written.
+        """
+        output_dir = self.config['output_dir']
+        previous = self.load_build_state('precompress')
+        has_brotli = brotli_available()
+        state = {}
+        jobs = []
+        for root, _, files in os.walk(output_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                rel_path = os.path.relpath(path, output_dir).replace(os.sep, '/')
+                if not file.endswith(PRECOMPRESS_EXTENSIONS) or rel_path == MANIFEST_NAME:
+                    continue
+                stat = os.stat(path)
+                signature = (stat.st_size, stat.st_mtime_ns, has_brotli)
+                entry = previous.get(rel_path)
+                # A wiped output_dir restores copied assets with their old mtimes, but not their siblings
+                if entry is not None and len(entry) == 4 and entry[:3] == signature and all(os.path.exists(path + suffix) for suffix in entry[3]):
+                    state[rel_path] = entry
+                else:
+                    jobs.append((rel_path, path, signature))
+        written = 0
+        results = self.run_jobs(self.precompress_file, [path for _, path, _ in jobs])
+        for (rel_path, _, signature), (count, kept) in zip(jobs, results):
+            state[rel_path] = signature + (kept,)
+            written += count
+        # Only outputs gone from output_dir are left; the jobs above handled every current one
+        for rel_path in previous.keys() - state.keys():
+            for suffix in ('.gz', '.br'):
+                sibling = os.path.join(output_dir, rel_path + suffix)
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+        if state != previous:
+            self.store_build_state('precompress', state)
+        return written
+
+    def write_manifest(self):
+        """
+        Record the sha256 of every file in output_dir in output_dir/manifest.json.
+        Hashes are kept in cache_dir keyed by (size, mtime), so only files written
+        or copied by this build are re-read. Returns {path: sha256}.
+        """
+        output_dir = self.config['output_dir']
+        previous = self.load_build_state('manifest')
+        stats = {}
+        for root, _, files in os.walk(output_dir):
+            for file in files:
+                path = os.path.join(root, file)
+                rel_path = os.path.relpath(path, output_dir).replace(os.sep, '/')
+                if rel_path == MANIFEST_NAME:
+                    continue
+                stat = os.stat(path)
+                key = (stat.st_size, stat.st_mtime_ns)
+                cached = previous.get(rel_path)
+                stats[rel_path] = (key, cached[1] if cached and cached[0] == key else file_sha256(path))
+        self.store_build_state('manifest', stats)
+        manifest = {rel_path: stats[rel_path][1] for rel_path in sorted(stats)}
+        self.write_if_changed(os.path.join(output_dir, MANIFEST_NAME), (json.dumps(manifest, indent=1) + '\n').encode('utf-8'))
+        return manifest
+
+    def deploy_diff(self, deployed_manifest_path):
+        """
+        Compare output_dir/manifest.json with the manifest of the last deploy and write
+        changed.txt and deleted.txt (paths relative to output_dir, one per line) next to
+        it, ready for rsync --files-from. A missing deployed manifest means everything changed.
+        """
+        manifest_path = os.path.join(self.config['output_dir'], MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise SystemExit(f"No {manifest_path}; build the site first")
+        with open(manifest_path, encoding='utf-8') as f:
+            current = json.load(f)
+        try:
+            with open(deployed_manifest_path, encoding='utf-8') as f:
+                deployed = json.load(f)
+        except (OSError, ValueError):
+            deployed = {}
+
+        changed = [path for path, digest in current.items() if deployed.get(path) != digest]
+        deleted = sorted(path for path in deployed if path not in current)
+        if changed or deleted:
+            changed.append(MANIFEST_NAME)
+
+        out_dir = os.path.dirname(os.path.abspath(deployed_manifest_path))
+        os.makedirs(out_dir, exist_ok=True)
+        for name, paths in (('changed.txt', changed), ('deleted.txt', deleted)):
+            with open(os.path.join(out_dir, name), 'w', encoding='utf-8') as f:
+                f.writelines(f"{path}\n" for path in paths)
+        print(f"{len(changed)} changed, {len(deleted)} deleted files to deploy")
+        return changed, deleted
+
+# Worker process entry point: Builder.__reduce__ unpickles to this in worker processes
+
+def _worker_builder(token, config, root):
+    """Unpickle a Builder, reusing this process's builder with the same token"""
+    builder = _worker_builders.get(token)
+    if builder is None:
+        builder = _rebuilt_builders[token] = Builder(config, root=root)
+        del _worker_builders[builder.token]
+        builder.token = token
+        _worker_builders[token] = builder
+    return builder
@@ -0,0 +1,120 @@
+// dsssg client-side search over the index written by the `search` build option.
+//
+// dsssgSearch(query) resolves to [{url, title, date, score}], best match first.
+// Every query word must match; the last one also matches as a prefix, so results
+// update while typing. Only index.json and the shards of the query's words are fetched.
+//
+// A page containing <input id="search-input"> and <ul id="search-results"> gets
+// live results when this script is loaded.
+(function () {
+    const SEARCH_URL = '/search/';
+    const STOP_WORDS = new Set(('a an and are as at be but by for from has have in is it its of on or ' +
+                                'that the this to was were will with').split(' '));
+    const shardCache = new Map();
+    let indexPromise = null;
+
+    function fetchJSON(url) {
+        return fetch(url).then((response) => {
+            if (!response.ok) throw new Error(`${url}: ${response.status}`);
+            return response.json();
+        });
+    }
+
+    function loadIndex() {
+        if (!indexPromise) indexPromise = fetchJSON(SEARCH_URL + 'index.json');
+        return indexPromise;
+    }
+
+    // Shards become prototype-less objects, so terms like "constructor" only match indexed terms
+    function loadShard(index, prefix) {
+        if (!index.shards.includes(prefix)) return Promise.resolve(Object.create(null));
+        if (!shardCache.has(prefix)) {
+            shardCache.set(prefix, fetchJSON(SEARCH_URL + encodeURIComponent(prefix) + '.json')
+                .then((shard) => Object.assign(Object.create(null), shard)));
+        }
+        return shardCache.get(prefix);
+    }
+
+    // Lengths and prefixes count code points, as Python's do
+    function codePoints(word) {
+        return Array.from(word);
+    }
+
+    // Same rules as search_terms() in dsssg.py
+    function terms(text) {
+        return (text.toLowerCase().match(/[\p{L}\p{N}]+/gu) || [])
+            .filter((term) => codePoints(term).length > 1 && !STOP_WORDS.has(term));
+    }
+
+    // {document number: weight} for one query word
+    function postings(shard, word, asPrefix) {
+        const scores = new Map();
+        const add = (list) => {
+            for (let i = 0; i < list.length; i += 2) {
+                scores.set(list[i], (scores.get(list[i]) || 0) + list[i + 1]);
+            }
+        };
+        if (asPrefix) {
+            for (const term in shard) {
+                if (term.startsWith(word)) add(shard[term]);
+            }
+        } else if (shard[word]) {
+            add(shard[word]);
+        }
+        return scores;
+    }
+
+    async function dsssgSearch(query) {
+        const words = terms(query);
+        if (!words.length) return [];
+        const index = await loadIndex();
+        const prefixLength = index.prefix_length;
+        const shards = await Promise.all(words.map((word) => loadShard(index, codePoints(word).slice(0, prefixLength).join(''))));
+
+        let scores = null;
+        words.forEach((word, i) => {
+            const asPrefix = i === words.length - 1 && codePoints(word).length >= prefixLength;
+            const matches = postings(shards[i], word, asPrefix);
+            if (scores === null) {
+                scores = matches;
+                return;
+            }
+            for (const [doc, score] of scores) {
+                if (matches.has(doc)) scores.set(doc, score + matches.get(doc));
+                else scores.delete(doc);
+            }
+        });
+
+        return [...scores]
+            .sort((a, b) => b[1] - a[1] || b[0] - a[0])
+            .map(([doc, score]) => {
+                const [url, title, date] = index.documents[doc];
+                return { url, title, date, score };
+            });
+    }
+
+    function bind() {
+        const input = document.getElementById('search-input');
+        const results = document.getElementById('search-results');
+        if (!input || !results) return;
+        let latest = 0;
+        input.addEventListener('input', async () => {
+            const request = ++latest;
+            const matches = await dsssgSearch(input.value);
+            if (request !== latest) return;
+            results.replaceChildren(...matches.slice(0, 50).map((match) => {
+                const item = document.createElement('li');
+                const link = document.createElement('a');
+                link.href = match.url;
+                link.textContent = match.title;
+                item.append(link);
+                if (match.date) item.append(` — ${match.date}`);
+                return item;
+            }));
+        });
+    }
+
+    window.dsssgSearch = dsssgSearch;
+    if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', bind);
+    else bind();
+})();
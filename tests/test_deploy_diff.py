@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dsssg import Builder
+
+DSSSG_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_post(root, slug, tags):
+    path = root / 'content' / 'posts' / f"{slug}.md"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"---\ntitle: {slug}\ndate: 2024-01-01\ntags: [{', '.join(tags)}]\n---\n\nBody of {slug}.\n")
+    return path
+
+
+def test_deleted_post_is_listed_in_deleted_txt(tmp_path):
+    write_post(tmp_path, 'kept', ['common'])
+    removed = write_post(tmp_path, 'removed', ['common', 'only-removed'])
+    config = {
+        'template_dir': os.path.join(DSSSG_DIR, 'templates'),
+        'tag_feeds': True,
+    }
+    Builder(config, root=tmp_path).build()
+    deployed = tmp_path / 'deployed' / 'manifest.json'
+    deployed.parent.mkdir()
+    deployed.write_bytes((tmp_path / 'site' / 'manifest.json').read_bytes())
+
+    removed.unlink()
+    builder = Builder(config, root=tmp_path)
+    builder.build()
+    changed, deleted = builder.deploy_diff(str(deployed))
+
+    assert 'posts/removed.html' in deleted
+    assert 'tags/only-removed.html' in deleted
+    assert not (tmp_path / 'site' / 'posts' / 'removed.html').exists()
+    assert (tmp_path / 'deployed' / 'deleted.txt').read_text().splitlines() == deleted